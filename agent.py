@@ -16,7 +16,7 @@ from openai import OpenAI
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams
-from langchain_ollama import OllamaEmbeddings
+from utils.embeddings import get_embeddings
 from uuid import uuid4
 from langchain.agents import create_agent
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -43,7 +43,7 @@ llm = ChatGoogleGenerativeAI(
     # other params...
 )
 
-embeddings = OllamaEmbeddings(model="mxbai-embed-large:latest")
+embeddings = get_embeddings()
 
 # completion = client.chat.completions.create(
 #   model="openai/gpt-4o",
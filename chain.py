@@ -1,20 +1,28 @@
 from langchain.agents import create_agent
 from langchain.tools import tool
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_ollama import ChatOllama
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams
-from uuid import uuid4
+from qdrant_client.http.models import Distance, PointIdsList, VectorParams
+from uuid import NAMESPACE_URL, uuid4, uuid5
 from utils.raw_data import get_data
-from langchain_ollama import OllamaEmbeddings
+from utils.embeddings import get_embeddings
+from utils.schema_store import atomic_write_json
 from langchain_openai import ChatOpenAI
 import os
+import json
+import time
+import hashlib
+import threading
+import asyncio
+from collections import OrderedDict
 from openai import OpenAI
 from dataclasses import dataclass
+from pathlib import Path
 from langchain.agents.structured_output import ToolStrategy
 from langchain_core.documents import Document
 
@@ -44,54 +52,272 @@ llm = ChatOpenAI(
 #     api_key=os.getenv("OPENROUTER_API_KEY"),
 # )
 
-# client = QdrantClient(url="http://localhost:6333")
+# Vector store backend: "memory" (default), "local" (on-disk, no server needed)
+# or "server" (a Qdrant server, e.g. docker with ./qdrant_storage mounted)
+QDRANT_MODE = os.getenv("QDRANT_MODE", "memory")
+QDRANT_PATH = os.getenv("QDRANT_PATH", "./qdrant_storage/local")
+QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
+COLLECTION_META_FILE = os.getenv(
+    "QDRANT_META_FILE", "./qdrant_storage/collections_meta.json"
+)
+
+
+def _create_client() -> QdrantClient:
+    if QDRANT_MODE == "server":
+        return QdrantClient(url=QDRANT_URL)
+    if QDRANT_MODE == "local":
+        return QdrantClient(path=QDRANT_PATH)
+    return QdrantClient(":memory:")
+
+
+def _load_collection_meta() -> Dict[str, Dict[str, float]]:
+    """Load per-collection timestamps; Qdrant itself doesn't track them."""
+    if QDRANT_MODE == "memory" or not os.path.exists(COLLECTION_META_FILE):
+        return {}
+    try:
+        with open(COLLECTION_META_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error reading collection metadata: {e}")
+        return {}
+
+
+def _save_collection_meta():
+    """Persist a snapshot of collection_meta; call with _meta_lock held."""
+    if QDRANT_MODE == "memory":
+        return
+    path = Path(COLLECTION_META_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write_json(path, {name: dict(meta) for name, meta in collection_meta.items()})
+
+
+def _touch_collection(collection_name: str, created: bool = False):
+    # Indexing jobs run in worker threads
+    with _meta_lock:
+        now = time.time()
+        meta = collection_meta.setdefault(collection_name, {"created_at": now})
+        if created:
+            meta["created_at"] = now
+        meta["updated_at"] = now
+        _save_collection_meta()
+
+
+def _get_collection_meta(collection_name: str) -> Dict[str, float]:
+    with _meta_lock:
+        return dict(collection_meta.get(collection_name, {}))
+
+
+client = _create_client()
+collection_meta = _load_collection_meta()
+_meta_lock = threading.Lock()
+
+embeddings = get_embeddings()
+
+RETRIEVER_CACHE_SIZE = int(os.getenv("RETRIEVER_CACHE_SIZE", "16"))
+
+
+def _build_retriever(root_url: str):
+    vector_store = QdrantVectorStore(
+        client=client,
+        collection_name=root_url,
+        embedding=embeddings,
+    )
+    return vector_store.as_retriever(search_type="mmr", search_kwargs={"k": 4})
+
+
+class RetrieverRegistry:
+    """
+    Per-site retrievers keyed by root_url.
+
+    Retrievers are built lazily from existing collections and the least
+    recently used ones are evicted once `max_size` is reached.
+    """
+
+    def __init__(self, max_size: int = RETRIEVER_CACHE_SIZE):
+        self.max_size = max_size
+        self._retrievers: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, root_url: str):
+        with self._lock:
+            if root_url in self._retrievers:
+                self._retrievers.move_to_end(root_url)
+                return self._retrievers[root_url]
+
+        if not check_collection_exists(root_url):
+            return None
 
-client = QdrantClient(":memory:")
+        retriever = _build_retriever(root_url)
+        self.put(root_url, retriever)
+        return retriever
 
-embeddings = OllamaEmbeddings(model="mxbai-embed-large:latest")
+    def put(self, root_url: str, retriever):
+        with self._lock:
+            self._retrievers[root_url] = retriever
+            self._retrievers.move_to_end(root_url)
+            while len(self._retrievers) > self.max_size:
+                evicted, _ = self._retrievers.popitem(last=False)
+                print(f"Evicted retriever for {evicted}")
 
-# Global variable to store the retriever
-current_retriever = None
-_initialized = False
+
+retrievers = RetrieverRegistry()
 
 def check_collection_exists(collection_name: str) -> bool:
     """Check if a collection exists in Qdrant."""
     return client.collection_exists(collection_name=collection_name)
 
+
+def collection_stats() -> Dict[str, Dict[str, Any]]:
+    """Report size and age of every collection in the vector store."""
+    now = time.time()
+    stats = {}
+    for collection in client.get_collections().collections:
+        name = collection.name
+        meta = _get_collection_meta(name)
+        stats[name] = {
+            "points": client.count(collection_name=name, exact=True).count,
+            "created_at": meta.get("created_at"),
+            "updated_at": meta.get("updated_at"),
+            "age_seconds": now - meta["updated_at"] if "updated_at" in meta else None,
+        }
+    return stats
+
+
+def report_collections():
+    """Log the collections loaded from the persistent backend at startup."""
+    stats = collection_stats()
+    print(f"Vector store ({QDRANT_MODE}): {len(stats)} collections")
+    for name, info in stats.items():
+        age = info["age_seconds"]
+        age_text = f"{age / 3600:.1f}h old" if age is not None else "age unknown"
+        print(f"  {name}: {info['points']} points, {age_text}")
+
+def collection_age(collection_name: str):
+    """Seconds since the collection was last (re-)indexed, or None if unknown."""
+    meta = _get_collection_meta(collection_name)
+    if "updated_at" not in meta:
+        return None
+    return time.time() - meta["updated_at"]
+
+
+def _point_id(document: Document) -> str:
+    """Deterministic point id, derived from the product URL and name."""
+    url = document.metadata.get("url", "")
+    title = document.metadata.get("title", "")
+    return str(uuid5(NAMESPACE_URL, f"{url}#{title}"))
+
+
+def _content_hash(document: Document) -> str:
+    metadata = {k: v for k, v in document.metadata.items() if k != "content_hash"}
+    raw = document.page_content + json.dumps(metadata, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _stored_points(collection_name: str) -> Dict[str, Dict[str, Any]]:
+    """Map point id -> stored metadata for a whole collection."""
+    points = {}
+    offset = None
+    while True:
+        batch, offset = client.scroll(
+            collection_name=collection_name,
+            limit=256,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False,
+        )
+        for point in batch:
+            points[str(point.id)] = (point.payload or {}).get("metadata", {})
+        if offset is None:
+            return points
+
+
+def index_documents(
+    documents: List[Document], root_url: str, crawled_pages: Optional[Iterable[str]] = None
+) -> Dict[str, int]:
+    """
+    Incrementally upsert documents into the collection of a site.
+
+    Only new or changed products are embedded. Stored products that are
+    missing from a page crawled this time are deleted; pages that weren't
+    crawled this time are left alone. `crawled_pages` lists the pages
+    crawled, including those that yielded nothing (defaults to the pages of
+    `documents`).
+    """
+    created = False
+    if not client.collection_exists(collection_name=root_url):
+        if not documents:
+            # Nothing to index: don't create an empty collection
+            return {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        client.create_collection(
+            collection_name=root_url,
+            vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
+        )
+        created = True
+
+    stored = {} if created else _stored_points(root_url)
+
+    incoming = {}
+    for document in documents:
+        document.metadata["content_hash"] = _content_hash(document)
+        incoming[_point_id(document)] = document
+
+    changed_ids = [
+        point_id
+        for point_id, document in incoming.items()
+        if stored.get(point_id, {}).get("content_hash") != document.metadata["content_hash"]
+    ]
+    if crawled_pages is None:
+        crawled_pages = {document.metadata.get("url") for document in documents}
+    else:
+        crawled_pages = set(crawled_pages) | {document.metadata.get("url") for document in documents}
+    stale_ids = [
+        point_id
+        for point_id, metadata in stored.items()
+        if point_id not in incoming and metadata.get("url") in crawled_pages
+    ]
+
+    if changed_ids:
+        vector_store = QdrantVectorStore(
+            client=client,
+            collection_name=root_url,
+            embedding=embeddings,
+        )
+        vector_store.add_documents(
+            documents=[incoming[point_id] for point_id in changed_ids], ids=changed_ids
+        )
+    if stale_ids:
+        client.delete(
+            collection_name=root_url,
+            points_selector=PointIdsList(points=stale_ids),
+        )
+    _touch_collection(root_url, created=created)
+
+    stats = {
+        "added": len([p for p in changed_ids if p not in stored]),
+        "updated": len([p for p in changed_ids if p in stored]),
+        "deleted": len(stale_ids),
+        "unchanged": len(incoming) - len(changed_ids),
+    }
+    print(f"Indexed {root_url}: {stats}")
+    return stats
+
+
 # async def initialize_retriever(href: str = None):
-async def initialize_retriever(documents: List[Document], root_url: str = None):
-    """Initialize retriever once and reuse"""
-    global current_retriever, _initialized, client
-    
-    # if _initialized and current_retriever is not None:
-    #     return current_retriever
-    
+async def initialize_retriever(
+    documents: List[Document], root_url: str = None, crawled_pages: Optional[Iterable[str]] = None
+):
+    """Index the documents of a site and register its retriever"""
     if documents is None:
         raise ValueError("documents is required for first initialization")
     
     # documents = await get_data(href)
+
+    # Embedding is blocking; keep it off the event loop
+    await asyncio.to_thread(index_documents, documents, root_url, crawled_pages)
+
+    retriever = retrievers.get(root_url)
     
-    client.create_collection(
-        collection_name=root_url,
-        vectors_config=VectorParams(size=1024, distance=Distance.COSINE),
-    )
-    
-    vector_store = QdrantVectorStore(
-        client=client,
-        collection_name=root_url,
-        embedding=embeddings,
-    )
-    
-    # uuids = [str(uuid4()) for _ in range(len(documents))]
-    vector_store.add_documents(documents=documents)
-    
-    current_retriever = vector_store.as_retriever(search_type="mmr", search_kwargs={"k": 4})
-    _initialized = True
-    
-    # if client.collection_exists(collection_name="demo_collection"):
-    #     print("Collection exists.")
-    
-    return current_retriever
+    return retriever
 
 # def build_retriever(href: str):
 #     global current_retriever
@@ -124,20 +350,21 @@ async def initialize_retriever(documents: List[Document], root_url: str = None):
 #     return retriever
 
 # @tool
-def store_search(query: str) -> Dict[str, Any]:
-    """Search the vector store.
+def store_search(query: str, root_url: str) -> Dict[str, Any]:
+    """Search the vector store of a site.
 
     Args:
         query: User query string
+        root_url: Root URL of the site to search
     """
-    global current_retriever
-    print(f"Query: {query}")
+    print(f"Query: {query} ({root_url})")
     try:
-        if current_retriever is None:
+        retriever = retrievers.get(root_url)
+        if retriever is None:
             return {
-                "error": "Vector store not initialized. Please call /init endpoint first."
+                "error": f"Vector store for {root_url} not initialized. Please call /init endpoint first."
             }
-        result = current_retriever.invoke(query)
+        result = retriever.invoke(query)
         # return compressed_docs
         return result
     except Exception as e:
@@ -188,14 +415,12 @@ llm_agent = create_agent(
 # )
 
 if __name__ == "__main__":
-    import asyncio
-
     async def main():
         # Example usage
         query = "Sample query"
-        result = store_search(query)
+        result = store_search(query, "http://example.com")
         print(result)
         
     documents = [Document(page_content="Sample document content", metadata={"source": "http://example.com"})]
 
-    asyncio.run(initialize_retriever(documents))
\ No newline at end of file
+    asyncio.run(initialize_retriever(documents, "http://example.com"))
\ No newline at end of file
@@ -881,7 +881,25 @@
                 ws.onmessage = function (event) {
                     const data = JSON.parse(event.data);
 
-                    if (data.type === 'products' && data.data) {
+                    if (data.type === 'product_batch' && data.data) {
+                        // Sản phẩm được gửi dần theo từng nhóm - hiển thị ngay
+                        if (statusMessageElement && statusMessageElement.parentNode) {
+                            statusMessageElement.remove();
+                            statusMessageElement = null;
+                        }
+                        self.addMessage({ type: 'products', data: data.data }, 'bot');
+                    } else if (data.type === 'done') {
+                        // Đã gửi hết sản phẩm
+                        if (statusMessageElement && statusMessageElement.parentNode) {
+                            statusMessageElement.remove();
+                            statusMessageElement = null;
+                        }
+                        self.hideTyping();
+                        if (!data.count) {
+                            self.addMessage({ type: 'products', data: [] }, 'bot');
+                        }
+                        ws.close();
+                    } else if (data.type === 'products' && data.data) {
                         // Xóa status message cũ nếu có
                         if (statusMessageElement && statusMessageElement.parentNode) {
                             statusMessageElement.remove();
@@ -15,14 +15,13 @@ from pydantic import BaseModel, Field
 import uvicorn
 
 # from agent import agent_builder, build_retriever
-from chain import check_collection_exists, initialize_retriever, store_search
+from chain import check_collection_exists, collection_age, collection_stats, initialize_retriever, report_collections, store_search
 from langchain_core.messages import HumanMessage
 import asyncio
-from typing import Dict, List
+from typing import Any, Awaitable, Callable, Dict, List
 import json
 from chain import llm_agent
 from agent import agent_builder
-from ddgs import DDGS
 from openai import OpenAI
 from langchain_openai import ChatOpenAI
 import os
@@ -38,10 +37,19 @@ from concurrent.futures import ThreadPoolExecutor
 from test_extract_info import finalize_name
 from utils.claude_crawl import UniversalProductScraper
 import time
-from utils.test_generated_schema import extract_with_generated_schema, create_xpath_strategy
-import requests
+from utils.test_generated_schema import create_xpath_strategy, stream_with_generated_schema
 from qdrant_client import QdrantClient
 from utils.test_crawl4ai import test_deep_crawl
+from utils.url_probe import probe_urls
+from utils.crawler_pool import crawler_pool
+from utils.index_queue import IndexQueue
+from utils.schema_store import schema_store
+from utils.http_client import close_client
+from utils.hover_cache import HoverCache
+from utils.query_cache import QueryCache
+from utils.search import search_client
+from utils.canonical_url import SeenSet
+from contextlib import asynccontextmanager
 
 # Configure logging
 logging.basicConfig(
@@ -49,7 +57,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(debug=True)
+REINDEX_AFTER_SECONDS = float(os.getenv("REINDEX_AFTER_SECONDS", str(24 * 3600)))
+PRODUCT_BATCH_SIZE = int(os.getenv("PRODUCT_BATCH_SIZE", "2"))
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "1"))
+MAX_SCHEMA_ATTEMPTS = int(os.getenv("MAX_SCHEMA_ATTEMPTS", "5"))
+HOVER_CACHE_TTL = float(os.getenv("HOVER_CACHE_TTL", "600"))
+HOVER_CACHE_SIZE = int(os.getenv("HOVER_CACHE_SIZE", "1024"))
+HOVER_WARMUP = os.getenv("HOVER_WARMUP", "0") == "1"
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "900"))
+QUERY_CACHE_STALE_TTL = float(os.getenv("QUERY_CACHE_STALE_TTL", str(24 * 3600)))
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "512"))
+
+
+async def index_site(root_url: str, search_query: str):
+    """Deep crawl a site and (re-)build its vector store."""
+    docs, crawled_pages = await test_deep_crawl(root_url, search_query)
+    if not docs:
+        # An empty collection would count as indexed and shadow live extraction
+        raise RuntimeError(f"Deep crawl of {root_url} yielded no products")
+    await initialize_retriever(docs, root_url, crawled_pages)
+
+
+index_queue = IndexQueue(index_site, workers=INDEX_WORKERS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    report_collections()
+    # Start the browsers once, so requests don't pay the cold Chromium startup
+    await crawler_pool.start()
+    index_queue.start()
+    yield
+    await index_queue.stop()
+    await crawler_pool.close()
+    await close_client()
+
+
+app = FastAPI(debug=True, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -97,17 +141,50 @@ def validate_and_sanitize_input(
 class Info(BaseModel):
     href: str
 
+class HoverLinks(BaseModel):
+    hrefs: List[str]
+
+
+scraper = UniversalProductScraper(
+    use_llm=False,  # Set True nếu muốn dùng LLM
+    llm_api_key="your-api-key-here"  # Thêm API key nếu dùng LLM
+)
+
+
+async def fetch_product_details(href: str):
+    logger.info("Crawling data...")
+    return await scraper.ascrape(href, method="auto")
+
+
+hover_cache = HoverCache(
+    fetch_product_details,
+    ttl=HOVER_CACHE_TTL,
+    max_entries=HOVER_CACHE_SIZE,
+)
+
+
+# The event loop only keeps weak references to tasks: hold warm-ups until done
+_warmup_tasks: set = set()
+
+
+def _start_warmup(urls: List[str]):
+    task = asyncio.create_task(hover_cache.warm(urls))
+    _warmup_tasks.add(task)
+    task.add_done_callback(_warmup_tasks.discard)
+
+
+def warm_hover_cache(products: list):
+    """Pre-fetch the details of products just sent to the client."""
+    if HOVER_WARMUP:
+        _start_warmup([p.get("link") for p in products])
+
+
 @app.post("/hover")
-def receive_hover(info: Info):
+async def receive_hover(info: Info):
     logger.info(f"User hovered: {info.href}")
     try:
-        scraper = UniversalProductScraper(
-            use_llm=False,  # Set True nếu muốn dùng LLM
-            llm_api_key="your-api-key-here"  # Thêm API key nếu dùng LLM
-        )
-        logger.info("Crawling data...")
         try:
-            crawled_data = scraper.scrape(info.href, method="auto")
+            crawled_data = await hover_cache.get(info.href)
             print("Crawled data:", crawled_data)
             # logger.info(f"Crawl successful, data length: {len(crawled_data)}")
             # clean = re.sub(r"<think>.*?</think>", "", crawled_data, flags=re.DOTALL).strip()
@@ -120,6 +197,13 @@ def receive_hover(info: Info):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/hover/warm")
+async def warm_hover(links: HoverLinks):
+    """Pre-fetch product links visible in the current result set."""
+    _start_warmup(links.hrefs)
+    return {"queued": len(links.hrefs)}
+
+
 @app.post("/init")
 # async def create_store(info: Info):
 async def create_store(documents: List[Document], root_url: str):
@@ -135,6 +219,24 @@ async def create_store(documents: List[Document], root_url: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/collections")
+def get_collections():
+    """Size and age of the per-site collections."""
+    return collection_stats()
+
+
+@app.get("/index/status")
+def get_index_status(root: str = None):
+    """Status of background indexing jobs, for all sites or a single one."""
+    return index_queue.status(root)
+
+
+@app.get("/schemas/stats")
+def get_schema_stats(root: str = None):
+    """Hit and yield statistics of the cached extraction schemas."""
+    return schema_store.stats(root)
+
+
 class ExtractedInfos(BaseModel):
     price: str = Field(description="giá")
     specs: str = Field(description="đặc điểm")
@@ -175,212 +277,266 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
-@app.websocket("/ws/")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
-    try:
-        while True:
-            data = await websocket.receive_text()
-            print("Received data via WebSocket:", data)
-            
-            # Parse JSON từ frontend
-            payload = json.loads(data)
-            search_query = payload.get("message", "")
-            root_url = payload.get("root", "https://www.thegioididong.com")
-            
-            start_time = time.perf_counter()
-            logger.info(f"Received crawl request: {search_query} for site: {root_url}")
-            print(f"Received crawl request: {search_query} for site: {root_url}")
+query_cache = QueryCache(
+    ttl=QUERY_CACHE_TTL,
+    stale_ttl=QUERY_CACHE_STALE_TTL,
+    max_entries=QUERY_CACHE_SIZE,
+)
 
-            try:
 
-                if not check_collection_exists(collection_name=root_url):
-                    package = {"status": "success", "message": "Searching for products..."}
-                    await websocket.send_json(package)
-                    print("Message sent: Searching for products...")                
-                    
-                    results = DDGS().text(
-                        f"{search_query} site:{root_url}", max_results=20
-                    )
-                    
-                    # selected_urls = []
+async def stream_products(notify: Callable[[dict], Awaitable[Any]], urls: List[str], root_url: str) -> list:
+    """Push product batches to the client as soon as each page is extracted."""
+    products = []
+    seen = SeenSet()
+    async for batch in stream_with_generated_schema(urls, root_url, batch_size=PRODUCT_BATCH_SIZE):
+        batch = [item for item in batch if seen.add(item["link"], item["name"])]
+        if not batch:
+            continue
+        products.extend(batch)
+        package = {"status": "success", "type": "product_batch", "data": batch}
+        await notify(package)
+    return products
 
-                    urls = []     
 
-                    for result in results:
+async def discard(package: dict):
+    """notify() for background runs that have no client to report to."""
 
-                        print("link:", result['href'])
 
-                        # document = Document(page_content=result['title'], metadata = {"url": result['href']})
+async def find_products(search_query: str, root_url: str, notify: Callable[[dict], Awaitable[Any]]) -> list:
+    """
+    Search pipeline for one query: the vector store when the site is indexed,
+    otherwise DDGS + schema extraction. Progress messages and product
+    batches go to `notify`.
+    """
+    if not check_collection_exists(collection_name=root_url):
+        package = {"status": "success", "message": "Searching for products..."}
+        await notify(package)
+        print("Message sent: Searching for products...")                
 
-                        # documents.append(document)
-                        # if result['href'] not in urls:
+        results = await search_client.search(search_query, root_url, max_results=20)
 
-                        urls.append(result['href'])
+        # selected_urls = []
 
+        urls = []     
 
-                    # await create_store(documents)
+        for result in results:
 
+            print("link:", result['href'])
 
-                    # pprint.pprint(doc)
+            # document = Document(page_content=result['title'], metadata = {"url": result['href']})
 
-                    # doc_content = "\n".join([d.page_content for d in doc])
+            # documents.append(document)
+            # if result['href'] not in urls:
 
-                    # response = client.responses.parse(
-                    #         model="openai/gpt-oss-20b:free",
-                    #         input=[
-                    #             {"role": "system", "content": f"Choose the document that suits the {data.message} the most."},
-                    #             {
-                    #                 "role": "user",
-                    #                 "content": doc_content,
-                    #             },
-                    #         ],
-                    #         # text_format=Answer,
-                    #     )
-                    # best_doc = response.output_parsed
+            urls.append(result['href'])
 
-                    # pprint.pprint(best_doc)
+        # Same product page under different tracking params: crawl it once
+        urls = SeenSet().filter(urls)
 
-                    # selected_urls.append(best_doc.metadata["url"])
+        # await create_store(documents)
 
-                    # crawled_pages = []
 
-                    # results = await asyncio.gather(
-                    #     *[crawl(doc.metadata["url"]) for doc in docs[:4]]
-                    # )
+        # pprint.pprint(doc)
 
-                    # with ThreadPoolExecutor(max_workers=4) as executor:
-                    #     results = list(executor.map(crawl, docs[:4]))
+        # doc_content = "\n".join([d.page_content for d in doc])
 
-                    # scraper = UniversalProductScraper(
-                    #     use_llm=False,  # Set True nếu muốn dùng LLM
-                    #     llm_api_key="your-api-key-here"  # Thêm API key nếu dùng LLM
-                    # )
+        # response = client.responses.parse(
+        #         model="openai/gpt-oss-20b:free",
+        #         input=[
+        #             {"role": "system", "content": f"Choose the document that suits the {data.message} the most."},
+        #             {
+        #                 "role": "user",
+        #                 "content": doc_content,
+        #             },
+        #         ],
+        #         # text_format=Answer,
+        #     )
+        # best_doc = response.output_parsed
 
-                    # products = await asyncio.gather(
-                    #     *[extract_with_generated_schema(r, data.root) for r in urls if r]
-                    # )
+        # pprint.pprint(best_doc)
 
-                    tmp=0
-                    
-                    try:
-                        for i, url in enumerate(urls):
-                            x=requests.get(url)
-                            if x.status_code == 200:
-                                tmp=i
-                                break
-                    except Exception as e:
-                        print("Error requesting URL:", str(e))
+        # selected_urls.append(best_doc.metadata["url"])
 
-                    package = {"status": "success", "message": "Generating schema..."}
+        # crawled_pages = []
 
-                    await websocket.send_json(package)
+        # results = await asyncio.gather(
+        #     *[crawl(doc.metadata["url"]) for doc in docs[:4]]
+        # )
+
+        # with ThreadPoolExecutor(max_workers=4) as executor:
+        #     results = list(executor.map(crawl, docs[:4]))
 
-                    strat = await create_xpath_strategy(urls[tmp], root_url, overwrite=False)
+        # scraper = UniversalProductScraper(
+        #     use_llm=False,  # Set True nếu muốn dùng LLM
+        #     llm_api_key="your-api-key-here"  # Thêm API key nếu dùng LLM
+        # )
 
-                    package = {"status": "success", "message": "Extracting results..."}
+        # products = await asyncio.gather(
+        #     *[extract_with_generated_schema(r, data.root) for r in urls if r]
+        # )
 
-                    await websocket.send_json(package)
+        live_urls = await probe_urls(urls)
+        print(f"Live URLs: {len(live_urls)}/{len(urls)}")
+        if not live_urls:
+            live_urls = urls
 
-                    products = await extract_with_generated_schema(urls[:10], root_url)
-                    
-                    print(f"Number of products: {len(products)}")
+        package = {"status": "success", "message": "Generating schema..."}
 
-                    count=0
+        await notify(package)
 
-                    strats = [strat]
+        strat = await create_xpath_strategy(live_urls[0], root_url, overwrite=False)
 
-                    while len(products)<1 and count<5:
-                        package = {"status": "success", "message": "Generating another schema..."}
+        package = {"status": "success", "message": "Extracting results..."}
 
-                        await websocket.send_json(package)
+        await notify(package)
 
-                        strat = await create_xpath_strategy(urls[tmp+1], root_url, overwrite=True, strategy_list=strats)
+        products = await stream_products(notify, urls[:10], root_url)
 
-                        strats.append(strat)
+        print(f"Number of products: {len(products)}")
 
-                        package = {"status": "success", "message": "Extracting results..."}
+        count=0
 
-                        products = await extract_with_generated_schema(urls[:10], root_url)
+        strats = [strat]
 
-                        count+=1
+        # Regenerate until a schema yields products: after a zero-yield run, or
+        # when the store has invalidated the schema
+        while (len(products) < 1 or not schema_store.has(root_url)) and count < MAX_SCHEMA_ATTEMPTS:
+            package = {"status": "success", "message": "Generating another schema..."}
 
-                        # await websocket.send_json(package)      
-                        
+            await notify(package)
 
+            sample_url = live_urls[min(count + 1, len(live_urls) - 1)]
 
-                    # for doc in docs[:5]:
-                    #     urls.append(doc.metadata["url"])
+            strat = await create_xpath_strategy(sample_url, root_url, overwrite=True, strategy_list=strats)
 
-                    # with ThreadPoolExecutor(max_workers=4) as executor:
-                    #     products = list(executor.map(scraper.scrape, urls))
+            strats.append(strat)
 
-                    # final_products = list((product for product in products if product))
+            package = {"status": "success", "message": "Extracting results..."}
 
-                    # try:
+            products = await stream_products(notify, urls[:10], root_url)
 
-                    #     unique = list({item["link"]: item for item in final_products}.values())
-                    # except Exception as e:
-                    #     print("Error deduplicating products:", str(e))
-                    #     unique = final_products
+            count+=1
 
+            # await notify(package)      
 
-                    # print("number of final_products:", len(unique))
 
-                    # for item in unique:
-                    #     print("product:", item)
 
-                    # products = []
+        # for doc in docs[:5]:
+        #     urls.append(doc.metadata["url"])
 
-                    # for doc in docs[:5]:
-                    #     products.append(scraper.scrape(doc.metadata["url"],method="auto"))
+        # with ThreadPoolExecutor(max_workers=4) as executor:
+        #     products = list(executor.map(scraper.scrape, urls))
 
-                    # # result = await crawl_request_html(doc[0].metadata["url"])
-                    # url, text, title, set_imgs = crawl(doc[0].metadata["url"])
-                    
-                    # product = scraper.scrape(url, method='auto')
+        # final_products = list((product for product in products if product))
 
-                    # # product = await extract_product_info(url, text, title, set_imgs, data.root, data.message)
+        # try:
 
-                    # products =[]
+        #     unique = list({item["link"]: item for item in final_products}.values())
+        # except Exception as e:
+        #     print("Error deduplicating products:", str(e))
+        #     unique = final_products
 
-                    # products.append(product)
 
-                    end_time = time.perf_counter()
-                    execution_time = end_time - start_time
-                    print(f"Thời gian thực hiện: {execution_time} giây")
+        # print("number of final_products:", len(unique))
 
-                    # return {"status": "success", "type": "products", "data": products}
-                    package = {"status": "success", "type": "products", "data": products}
+        # for item in unique:
+        #     print("product:", item)
 
-                    await websocket.send_json(package)
+        # products = []
 
-                    docs = await test_deep_crawl(root_url, search_query)
-                        
-                    await create_store(docs, root_url)
-                
-                else:
-                    package = {"status": "success", "message": "Vector store already exists. Skipping crawl."}
+        # for doc in docs[:5]:
+        #     products.append(scraper.scrape(doc.metadata["url"],method="auto"))
+
+        # # result = await crawl_request_html(doc[0].metadata["url"])
+        # url, text, title, set_imgs = crawl(doc[0].metadata["url"])
+
+        # product = scraper.scrape(url, method='auto')
+
+        # # product = await extract_product_info(url, text, title, set_imgs, data.root, data.message)
+
+        # products =[]
+
+        # products.append(product)
+
+        # return {"status": "success", "type": "products", "data": products}
+        package = {"status": "success", "type": "done", "count": len(products)}
+
+        await notify(package)
+
+        # Index the site in the background; don't block this connection
+        index_queue.enqueue(root_url, search_query)
+        return products
+
+    else:
+        package = {"status": "success", "message": "Vector store already exists. Skipping crawl."}
+        await notify(package)
+        print("Message sent: Vector store already exists. Skipping crawl.")
+        docs = store_search(search_query, root_url)
+        print(f"Number of docs from store_search: {len(docs)}")
+        final_docs = []
+        for doc in docs:
+            print("doc:", doc)
+            final_doc = {}
+            final_doc['name'] = doc.metadata.get('title', '')
+            final_doc['link'] = doc.metadata.get('url', '')
+            final_doc['description'] = doc.page_content
+            final_doc['image'] = doc.metadata.get('image_url', '')
+            final_docs.append(final_doc)
+        try:                    
+            package = {"status": "success", "type": "products", "data": final_docs}  
+            await notify(package)     
+            print("Sent documents from vector store.")       
+        except Exception as e:
+            print("Error sending doc:", str(e))
+
+        # Prices and stock change daily: refresh stale collections incrementally
+        age = collection_age(root_url)
+        if age is None or age > REINDEX_AFTER_SECONDS:
+            print(f"Collection for {root_url} is stale, re-indexing...")
+            index_queue.enqueue(root_url, search_query)
+
+    return final_docs
+
+
+@app.websocket("/ws/")
+async def websocket_endpoint(websocket: WebSocket):
+    await manager.connect(websocket)
+    try:
+        while True:
+            data = await websocket.receive_text()
+            print("Received data via WebSocket:", data)
+            
+            # Parse JSON từ frontend
+            payload = json.loads(data)
+            search_query = payload.get("message", "")
+            root_url = payload.get("root", "https://www.thegioididong.com")
+            
+            start_time = time.perf_counter()
+            logger.info(f"Received crawl request: {search_query} for site: {root_url}")
+            print(f"Received crawl request: {search_query} for site: {root_url}")
+
+            try:
+                cached = query_cache.get(search_query, root_url)
+                if cached is not None:
+                    products, stale = cached
+                    package = {"status": "success", "type": "products", "data": products}
                     await websocket.send_json(package)
-                    print("Message sent: Vector store already exists. Skipping crawl.")
-                    docs = store_search(f"{search_query}")
-                    print(f"Number of docs from store_search: {len(docs)}")
-                    final_docs = []
-                    for doc in docs:
-                        print("doc:", doc)
-                        final_doc = {}
-                        final_doc['name'] = doc.metadata.get('title', '')
-                        final_doc['link'] = doc.metadata.get('url', '')
-                        final_doc['description'] = doc.page_content
-                        final_doc['image'] = doc.metadata.get('image_url', '')
-                        final_docs.append(final_doc)
-                    try:                    
-                        package = {"status": "success", "type": "products", "data": final_docs}  
-                        await websocket.send_json(package)     
-                        print("Sent documents from vector store.")       
-                    except Exception as e:
-                        print("Error sending doc:", str(e))
-                            
+                    print(f"Sent {len(products)} cached products (stale: {stale})")
+                    if stale:
+                        query_cache.refresh(
+                            search_query,
+                            root_url,
+                            lambda q=search_query, r=root_url: find_products(q, r, discard),
+                        )
+                else:
+                    products = await find_products(search_query, root_url, websocket.send_json)
+                    query_cache.put(search_query, root_url, products)
+
+                warm_hover_cache(products)
+
+                end_time = time.perf_counter()
+                execution_time = end_time - start_time
+                print(f"Thời gian thực hiện: {execution_time} giây")
 
             except Exception as e:
                 logger.error(f"Error in /crawl endpoint: {str(e)}", exc_info=True)
@@ -4,10 +4,13 @@ Article Scraper - Scrape blog posts, news articles, guides
 
 import re
 import json
-import requests
+import asyncio
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from datetime import datetime
+from utils.html_parser import PageFacts, collect_facts, make_soup
+from utils.http_client import fetch_text, get_text_sync
+from utils.rate_limit import SCRAPE_CONCURRENCY, rate_limited_batch
 
 
 class ArticleScraper:
@@ -34,19 +37,50 @@ class ArticleScraper:
             if not html:
                 return {"error": "Cannot fetch URL", "url": url}
             
+            return self._process(html, url)
+            
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return {"error": str(e), "url": url}
+    
+    async def ascrape(self, url: str) -> Dict:
+        """
+        Async version of scrape: non-blocking fetch, parsing in a worker thread
+        """
+        try:
+            print(f"📰 Scraping article: {url}")
+            
+            html = await fetch_text(url, headers=self.headers, max_retries=1)
+            if not html:
+                return {"error": "Cannot fetch URL", "url": url}
+            
+            return await asyncio.to_thread(self._process, html, url)
+            
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            return {"error": str(e), "url": url}
+    
+    def _process(self, html: str, url: str) -> Dict:
+        """
+        Extract the article from fetched HTML
+        """
+        try:
             # Parse
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = make_soup(html)
+            
+            # JSON-LD and meta tags are collected in a single DOM pass
+            facts = collect_facts(soup)
             
             # Extract data
             article = {}
             
             # 1. Try Article schema (JSON-LD)
-            json_ld = self._extract_json_ld(soup)
+            json_ld = self._extract_json_ld(soup, facts)
             if json_ld:
                 article.update(json_ld)
             
             # 2. Extract from meta tags
-            meta_data = self._extract_meta_tags(soup)
+            meta_data = self._extract_meta_tags(soup, facts)
             if meta_data:
                 for key, value in meta_data.items():
                     if key not in article or not article[key]:
@@ -75,23 +109,22 @@ class ArticleScraper:
         Fetch HTML from URL
         """
         try:
-            response = requests.get(url, headers=self.headers, timeout=15)
-            response.encoding = 'utf-8'
-            return response.text
+            _, text = get_text_sync(url, headers=self.headers, timeout=15)
+            return text
         except Exception as e:
             print(f"Fetch error: {e}")
             return None
     
-    def _extract_json_ld(self, soup: BeautifulSoup) -> Dict:
+    def _extract_json_ld(self, soup: BeautifulSoup, facts: Optional[PageFacts] = None) -> Dict:
         """
         Extract from Article JSON-LD schema
         """
         result = {}
-        scripts = soup.find_all('script', type='application/ld+json')
+        facts = facts or collect_facts(soup)
         
-        for script in scripts:
+        for script in facts.json_ld:
             try:
-                data = json.loads(script.string)
+                data = json.loads(script)
                 if isinstance(data, list):
                     data = data[0]
                 
@@ -145,11 +178,12 @@ class ArticleScraper:
         
         return None
     
-    def _extract_meta_tags(self, soup: BeautifulSoup) -> Dict:
+    def _extract_meta_tags(self, soup: BeautifulSoup, facts: Optional[PageFacts] = None) -> Dict:
         """
         Extract from Open Graph and meta tags
         """
         result = {}
+        facts = facts or collect_facts(soup)
         
         # Open Graph
         og_props = {
@@ -164,22 +198,20 @@ class ArticleScraper:
         }
         
         for prop, field in og_props.items():
-            tag = soup.find('meta', property=prop)
-            if tag and tag.get('content'):
+            content = facts.meta_property.get(prop)
+            if content:
                 if field == 'tags':
-                    result.setdefault('tags', []).append(tag['content'])
+                    result.setdefault('tags', []).append(content)
                 else:
-                    result[field] = tag['content']
+                    result[field] = content
         
         # Twitter Card
-        twitter_title = soup.find('meta', attrs={'name': 'twitter:title'})
-        if twitter_title and 'title' not in result:
-            result['title'] = twitter_title.get('content')
+        if 'twitter:title' in facts.meta_name and 'title' not in result:
+            result['title'] = facts.meta_name['twitter:title']
         
         # Standard meta
-        description = soup.find('meta', attrs={'name': 'description'})
-        if description and 'description' not in result:
-            result['description'] = description.get('content')
+        if 'description' in facts.meta_name and 'description' not in result:
+            result['description'] = facts.meta_name['description']
         
         return result
     
@@ -386,22 +418,30 @@ class ArticleScraper:
         
         return date_str  # Return as-is if can't parse
     
+    async def scrape_batch(
+        self,
+        urls: List[str],
+        max_concurrency: int = SCRAPE_CONCURRENCY,
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """
+        Scrape articles concurrently, yielding (url, article) as each finishes.
+        Requests to the same site are paced by a per-domain token bucket
+        """
+        done = 0
+        async for url, article in rate_limited_batch(urls, self.ascrape, max_concurrency):
+            done += 1
+            print(f"\n[{done}/{len(urls)}] {url}")
+            yield url, article
+    
     def scrape_multiple(self, urls: List[str]) -> List[Dict]:
         """
-        Scrape multiple articles
+        Scrape multiple articles, returned in the order of `urls`
         """
-        import time
-        
-        articles = []
-        for i, url in enumerate(urls, 1):
-            print(f"\n[{i}/{len(urls)}]")
-            article = self.scrape(url)
-            articles.append(article)
-            
-            if i < len(urls):
-                time.sleep(1)
+        async def _collect():
+            return {url: article async for url, article in self.scrape_batch(urls)}
         
-        return articles
+        articles = asyncio.run(_collect())
+        return [articles[url] for url in urls]
     
     def save_json(self, data, filename: str = 'articles.json'):
         """
@@ -0,0 +1,82 @@
+"""
+Benchmark: parsing + structured-data lookup of the saved pages
+
+Compares the previous approach (html.parser + one find/find_all pass per
+JSON-LD / meta / itemprop lookup) with utils.html_parser (configurable
+backend + a single collect_facts pass).
+
+Usage: python -m utils.bench_parser [repeats]
+"""
+
+import re
+import sys
+import time
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from utils.html_parser import collect_facts
+
+PAGES = ["html.html", "regex.html", "demofile.txt"]
+
+OG_PROPS = ["og:title", "og:description", "og:image", "og:price:amount", "og:price:currency"]
+TWITTER_NAMES = ["twitter:title", "twitter:description", "twitter:image"]
+ITEMPROPS = ["name", "description", "price", "priceCurrency", "image", "sku", "brand"]
+
+
+def legacy(markup: str):
+    """What UniversalProductScraper did before: html.parser and many passes"""
+    soup = BeautifulSoup(markup, "html.parser")
+    soup.find("script", type="application/ld+json")
+    soup.find_all("meta", property=re.compile(r"^og:"))
+    soup.find_all("script", type="application/ld+json")
+    for prop in OG_PROPS:
+        soup.find("meta", property=prop)
+    for name in TWITTER_NAMES:
+        soup.find("meta", attrs={"name": name})
+    for itemprop in ITEMPROPS:
+        soup.find(attrs={"itemprop": itemprop})
+    return soup
+
+
+def single_pass(markup: str, parser: str):
+    soup = BeautifulSoup(markup, parser)
+    return collect_facts(soup)
+
+
+def available_parsers():
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+
+        parsers.insert(0, "lxml")
+    except ImportError:
+        pass
+    return parsers
+
+
+def timeit(fn, *args, repeats: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"{'page':<14}{'variant':<28}{'best ms':>10}{'speedup':>10}")
+    for page in PAGES:
+        path = Path(page)
+        if not path.exists():
+            print(f"{page:<14}missing, skipped")
+            continue
+        markup = path.read_text(encoding="utf-8", errors="ignore")
+
+        baseline = timeit(legacy, markup, repeats=repeats)
+        print(f"{page:<14}{'html.parser, multi-pass':<28}{baseline:>10.1f}{1.0:>9.1f}x")
+        for parser in available_parsers():
+            elapsed = timeit(single_pass, markup, parser, repeats=repeats)
+            print(f"{page:<14}{parser + ', single pass':<28}{elapsed:>10.1f}{baseline / elapsed:>9.1f}x")
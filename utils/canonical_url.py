@@ -0,0 +1,103 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+# Query parameters that only carry campaign / click tracking
+TRACKING_PREFIXES = ("utm_", "itm_")
+TRACKING_PARAMS = {"fbclid", "gclid", "gclsrc", "dclid", "msclkid", "srsltid", "spm", "mc_cid", "mc_eid", "_ga"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Per-site rules, matched on the host or a parent domain:
+# - keep_params: the only query parameters that identify a page (others are dropped)
+# - drop_params: extra site-specific tracking parameters
+# - strip_trailing_slash: "/abc/" and "/abc" are the same page
+SITE_RULES: Dict[str, Dict] = {
+    # Product identity is in the path (-i.<shop>.<item>); sp_atk, xptdk, ... are tracking
+    "shopee.vn": {"keep_params": ()},
+    # -i<item>-s<sku>.html; the query only carries search/tracking context
+    "lazada.vn": {"keep_params": ()},
+    # spid selects the seller offer of a product
+    "tiki.vn": {"keep_params": ("spid",)},
+    "thegioididong.com": {"strip_trailing_slash": True},
+}
+
+
+def _site_rules(host: str) -> Dict:
+    parts = host.split(".")
+    for i in range(len(parts) - 1):
+        rules = SITE_RULES.get(".".join(parts[i:]))
+        if rules is not None:
+            return rules
+    return {}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical form of a page URL, used as its identity everywhere (crawl
+    de-duplication, HTTP cache, hover cache, vector ids): lowercase scheme
+    and host, no default port, no fragment, no tracking parameters, and the
+    remaining parameters sorted. Non-web URLs (file:, raw:, ...) are returned
+    unchanged.
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        return url
+    host = (parsed.hostname or "").lower()
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    netloc = f"{host}:{port}" if port and port != DEFAULT_PORTS.get(scheme) else host
+
+    rules = _site_rules(host)
+    keep = rules.get("keep_params")
+    drop = set(rules.get("drop_params", ()))
+    query = sorted(
+        (k, v)
+        for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PREFIXES)
+        and k.lower() not in TRACKING_PARAMS
+        and k not in drop
+        and (keep is None or k in keep)
+    )
+
+    path = parsed.path or "/"
+    if rules.get("strip_trailing_slash") and len(path) > 1:
+        path = path.rstrip("/") or "/"
+    return urlunparse((scheme, netloc, path, parsed.params, urlencode(query), ""))
+
+
+class SeenSet:
+    """
+    Memory-compact set of already seen pages.
+
+    Stores a 64-bit hash of the canonical URL (plus an optional extra key,
+    e.g. a product name) instead of the string, so large crawls stay small.
+    """
+
+    def __init__(self):
+        self._hashes = set()
+
+    @staticmethod
+    def _hash(url: str, extra: str = "") -> int:
+        key = f"{canonical_url(url)}\0{extra}".encode("utf-8")
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+    def add(self, url: str, extra: str = "") -> bool:
+        """Record a page; returns False if it was already seen."""
+        digest = self._hash(url, extra)
+        if digest in self._hashes:
+            return False
+        self._hashes.add(digest)
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        return self._hash(url) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def filter(self, urls: Iterable[Optional[str]]) -> List[str]:
+        """Canonical URLs not seen before, in input order."""
+        return [canonical_url(url) for url in urls if url and self.add(url)]
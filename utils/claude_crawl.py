@@ -5,14 +5,20 @@ Hỗ trợ trích xuất thông tin sản phẩm từ nhiều loại website kh
 
 import re
 import json
-import requests
 from bs4 import BeautifulSoup
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+import soupsieve
 from urllib.parse import urlparse
 import time
 import random
 import html
 import asyncio
+from utils.http_client import fetch_text, get_text_sync
+from utils.debug_artifacts import capture
+from utils.html_parser import PageFacts, collect_facts, make_soup
+from utils.rate_limit import SCRAPE_CONCURRENCY, THROTTLE_STATUSES, rate_limited_batch
 # from utils.crawl_request_html import crawl_webpage as async_crawl_webpage
 
 def get_useragent():
@@ -39,6 +45,130 @@ def get_useragent():
     return f"{lynx_version} {libwww_version} {ssl_mm_version} {openssl_version}"
 
 
+# Các pattern chung cho mọi website (biên dịch sẵn một lần)
+UNIVERSAL_PATTERNS = {
+    "price": [
+        re.compile(r"(?:Giá [^:]*)[:\s]*([\d.,]+)|(\d{1,3}(?:\.\d{3})+\s*(?:đ))", re.IGNORECASE),
+        # r"(?:VND)\s*([\d.,]+)",
+        # r"([\d.,]+)\s*(?:đ)",
+    ],
+    # "name": [
+    #     r"<h1[^>]*>(.*?)</h1>",
+    #     r"<title>(.*?)</title>",
+    # ],
+}
+
+WHITESPACE_RE = re.compile(r"\s+")
+EMPTY_INFO_RE = re.compile(r":\s*\.?$")
+DISALLOWED_CHARS_RE = re.compile(r"[^0-9A-Za-zÀ-ỹà-ỹ\s\.,:;\(\)\-\–\/%°]+")
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+NUMBER_RE = re.compile(r"([\d.,]+)")
+
+# Config cho các website phổ biến
+SITE_CONFIGS = {
+    "shopee.vn": {
+        "selectors": {
+            "name": [".product-title", "h1", '[class*="product-name"]'],
+            "price": ['[class*="price"]', ".product-price"],
+            "description": [".product-description", '[class*="description"]'],
+            "images": ['img[class*="product"]', ".product-image img"],
+        },
+        "json_ld": True,  # Hỗ trợ JSON-LD schema
+    },
+    "lazada.vn": {
+        "selectors": {
+            "name": [".pdp-product-title", "h1"],
+            "price": [".pdp-price", '[class*="price"]'],
+            "description": [".detail-content"],
+        },
+        "json_ld": True,
+    },
+    "tiki.vn": {
+        "selectors": {
+            "name": ['h1[class*="title"]', ".product-name"],
+            "price": ['[class*="product-price"]'],
+            "rating": ['[class*="rating"]'],
+        },
+        "json_ld": True,
+    },
+    "sendo.vn": {
+        "selectors": {
+            "name": [".product_name", "h1"],
+            "price": [".product_price"],
+        },
+    },
+    # Thêm config cho các site khác
+    "default": {
+        "selectors": {
+            "name": [
+                "h1",
+                '[itemprop="name"]',
+                ".product-title",
+                ".product-name",
+            ],
+            "price": [
+                '[itemprop="price"]',
+                ".price",
+                ".product-price",
+                '[class*="price"]',
+            ],
+            "description": [
+                '[itemprop="description"]',
+                ".description",
+                ".product-description",
+                ".summary-content"                        
+            ],
+            "images": [
+                '[itemprop="image"]',
+                ".product-image img",
+                'img[alt*="product"]',
+                'img'
+            ],
+            "sku": ['[itemprop="sku"]', ".sku", ".product-code"],
+            "brand": ['[itemprop="brand"]', ".brand"],
+        },
+        "json_ld": True,
+    },
+}
+
+# Chỉ các trường này được lấy từ selectors (các trường khác lấy từ meta/JSON-LD),
+# nên plan không cần chạy selectors của những trường còn lại
+SELECTOR_FIELDS = ("description", "images")
+
+
+@dataclass(frozen=True)
+class ExtractionPlan:
+    """
+    Selectors của một host đã được biên dịch sẵn, dùng chung (chỉ đọc) giữa các request
+    """
+
+    host: str
+    selectors: Tuple[Tuple[str, Tuple[soupsieve.SoupSieve, ...]], ...]
+    json_ld: bool
+
+
+@lru_cache(maxsize=256)
+def get_extraction_plan(host: str) -> ExtractionPlan:
+    """
+    Tìm config theo host (khớp chính xác, sau đó theo domain cha) và biên dịch selectors
+    """
+    host = host.lower().split(":")[0]
+    config = None
+    parts = host.split(".")
+    for i in range(len(parts) - 1):
+        config = SITE_CONFIGS.get(".".join(parts[i:]))
+        if config:
+            break
+    config = config or SITE_CONFIGS["default"]
+
+    selectors = tuple(
+        (field, tuple(soupsieve.compile(selector) for selector in config["selectors"][field]))
+        for field in SELECTOR_FIELDS
+        if field in config["selectors"]
+    )
+    return ExtractionPlan(host=host, selectors=selectors, json_ld=config.get("json_ld", False))
+
+
 class UniversalProductScraper:
     """
     Scraper tổng hợp có thể xử lý nhiều loại website
@@ -59,17 +189,7 @@ class UniversalProductScraper:
         }
 
         # Các pattern chung cho mọi website
-        self.universal_patterns = {
-            "price": [
-                r"(?:Giá [^:]*)[:\s]*([\d.,]+)|(\d{1,3}(?:\.\d{3})+\s*(?:đ))"
-                # r"(?:VND)\s*([\d.,]+)",
-                # r"([\d.,]+)\s*(?:đ)",
-            ],
-            # "name": [
-            #     r"<h1[^>]*>(.*?)</h1>",
-            #     r"<title>(.*?)</title>",
-            # ],
-        }
+        self.universal_patterns = UNIVERSAL_PATTERNS
 
         # Config cho từng website cụ thể
         self.site_configs = self._load_site_configs()
@@ -78,71 +198,7 @@ class UniversalProductScraper:
         """
         Config cho các website phổ biến
         """
-        return {
-            "shopee.vn": {
-                "selectors": {
-                    "name": [".product-title", "h1", '[class*="product-name"]'],
-                    "price": ['[class*="price"]', ".product-price"],
-                    "description": [".product-description", '[class*="description"]'],
-                    "images": ['img[class*="product"]', ".product-image img"],
-                },
-                "json_ld": True,  # Hỗ trợ JSON-LD schema
-            },
-            "lazada.vn": {
-                "selectors": {
-                    "name": [".pdp-product-title", "h1"],
-                    "price": [".pdp-price", '[class*="price"]'],
-                    "description": [".detail-content"],
-                },
-                "json_ld": True,
-            },
-            "tiki.vn": {
-                "selectors": {
-                    "name": ['h1[class*="title"]', ".product-name"],
-                    "price": ['[class*="product-price"]'],
-                    "rating": ['[class*="rating"]'],
-                },
-                "json_ld": True,
-            },
-            "sendo.vn": {
-                "selectors": {
-                    "name": [".product_name", "h1"],
-                    "price": [".product_price"],
-                },
-            },
-            # Thêm config cho các site khác
-            "default": {
-                "selectors": {
-                    "name": [
-                        "h1",
-                        '[itemprop="name"]',
-                        ".product-title",
-                        ".product-name",
-                    ],
-                    "price": [
-                        '[itemprop="price"]',
-                        ".price",
-                        ".product-price",
-                        '[class*="price"]',
-                    ],
-                    "description": [
-                        '[itemprop="description"]',
-                        ".description",
-                        ".product-description",
-                        ".summary-content"                        
-                    ],
-                    "images": [
-                        '[itemprop="image"]',
-                        ".product-image img",
-                        'img[alt*="product"]',
-                        'img'
-                    ],
-                    "sku": ['[itemprop="sku"]', ".sku", ".product-code"],
-                    "brand": ['[itemprop="brand"]', ".brand"],
-                },
-                "json_ld": True,
-            },
-        }
+        return SITE_CONFIGS
 
     def _clean_redundant_text(self, text):
         # 1. Tách văn bản thành các câu dựa trên dấu chấm
@@ -153,11 +209,11 @@ class UniversalProductScraper:
 
         for segment in parts:
             # 2. Chuẩn hóa: loại bỏ khoảng trắng dư thừa
-            segment = re.sub(r"\s+", " ", segment).strip()
+            segment = WHITESPACE_RE.sub(" ", segment).strip()
 
             # 3. Loại bỏ các mẫu "Rác" có dạng "Thông tin: ." (không có giá trị thực)
             # Regex này tìm các chuỗi kết thúc bằng dấu hai chấm và khoảng trắng/dấu chấm rỗng
-            if re.search(r":\s*\.?$", segment):
+            if EMPTY_INFO_RE.search(segment):
                 continue
 
             # 4. Kiểm tra trùng lặp
@@ -185,27 +241,48 @@ class UniversalProductScraper:
             # return {"error": "Failed to fetch URL"}
             return None
 
+        return self._process(html_content, url, method)
+
+    async def ascrape(self, url: str, method: str = "auto") -> Dict[str, Any]:
+        """
+        Async version of scrape: fetches through the shared keep-alive
+        client and parses in a worker thread, without blocking the event loop
+        """
+        print(f"🔍 Đang scrape: {url}")
+
+        html_content = await fetch_text(url, headers=self.headers)
+        if not html_content:
+            return None
+
+        return await asyncio.to_thread(self._process, html_content, url, method)
+
+    def _process(self, html_content: str, url: str, method: str = "auto") -> Dict[str, Any]:
+        """
+        Parse HTML đã tải về và trích xuất thông tin sản phẩm
+        """
         # Parse HTML
-        soup = BeautifulSoup(html_content, "html.parser")
-        with open("demofile.txt", "w") as f:
-            f.write(str(soup))
+        soup = make_soup(html_content)
+        capture("page.html", lambda: str(soup))
+
+        # JSON-LD, meta tags và microdata được thu thập trong một lần duyệt DOM
+        facts = collect_facts(soup)
 
         # Xác định phương pháp scrape
         if method == "auto":
-            method = self._detect_best_method(soup, url)
+            method = self._detect_best_method(soup, url, facts)
 
         print(f"📊 Sử dụng phương pháp: {method}")
 
         # Scrape theo phương pháp
         if method == "json_ld":
-            result = self._extract_from_json_ld(soup)
+            result = self._extract_from_json_ld(soup, facts)
         elif method == "llm" and self.use_llm:
             result = self._extract_with_llm(html_content)
         elif method == "hybrid":
-            result = self._extract_hybrid(soup, html_content)
+            result = self._extract_hybrid(soup, html_content, facts)
 
         else:  # html
-            result = self._extract_from_html(soup, url)
+            result = self._extract_from_html(soup, url, facts)
             # print("result html:", result)
 
         print("raw result:", result)
@@ -255,21 +332,19 @@ class UniversalProductScraper:
         max_retries = 3
         for i in range(max_retries):
             try:
-                response = requests.get(url, headers=self.headers, timeout=15)
-                # Fix encoding UTF-8
-                response.encoding = "utf-8"
-                if response.status_code == 200:
-                    return response.text
+                # Cache HTTP và scheduler dùng chung: giới hạn theo domain, tự giãn cách khi bị chặn
+                status_code, text = get_text_sync(url, headers=self.headers, timeout=15)
+                if status_code == 200:
+                    return text
 
                 # response = await async_crawl_webpage(url)
                 # if response:
                 #     return response
                 
-                elif response.status_code == 403:
+                elif status_code in THROTTLE_STATUSES:
                     print(f"⚠️  Bị chặn, thử lại lần {i + 1}...")
-                    time.sleep(2)
                 else:
-                    print(f"❌ Status code: {response.status_code}, url: {url}")
+                    print(f"❌ Status code: {status_code}, url: {url}")
                     return None
             except Exception as e:
                 print(f"❌ Error: {e}")
@@ -277,17 +352,18 @@ class UniversalProductScraper:
                     time.sleep(2)
         return None
 
-    def _detect_best_method(self, soup: BeautifulSoup, url: str) -> str:
+    def _detect_best_method(self, soup: BeautifulSoup, url: str, facts: Optional[PageFacts] = None) -> str:
         """
         Tự động phát hiện phương pháp scrape tốt nhất
         """
+        facts = facts or collect_facts(soup)
+
         # Check JSON-LD
-        json_ld = soup.find("script", type="application/ld+json")
-        if json_ld:
+        if facts.json_ld:
             return "json_ld"
 
         # Check meta tags (Open Graph, Twitter Card)
-        og_tags = soup.find_all("meta", property=re.compile(r"^og:"))
+        og_tags = [prop for prop in facts.meta_property if prop.startswith("og:")]
         if len(og_tags) >= 3:
             return "html"  # Có đủ meta tags
 
@@ -297,20 +373,18 @@ class UniversalProductScraper:
 
         return "html"
 
-    def _extract_from_json_ld(self, soup: BeautifulSoup) -> Dict:
+    def _extract_from_json_ld(self, soup: BeautifulSoup, facts: Optional[PageFacts] = None) -> Dict:
         """
         Trích xuất từ JSON-LD Schema (chuẩn Schema.org)
         Đây là cách tốt nhất nếu website hỗ trợ
         """
         result = {}
 
-        json_ld_scripts = soup.find_all("script", type="application/ld+json")
-        # with open("demofile.txt", "w") as f:
-        #     f.write(str(json_ld_scripts))
+        facts = facts or collect_facts(soup)
 
-        for script in json_ld_scripts:
+        for script in facts.json_ld:
             try:
-                data = json.loads(script.string)
+                data = json.loads(script)
 
                 # Handle array
                 if isinstance(data, list):
@@ -351,21 +425,23 @@ class UniversalProductScraper:
 
         return result
 
-    def _extract_from_html(self, soup: BeautifulSoup, url: str) -> Dict:
+    def _extract_from_html(self, soup: BeautifulSoup, url: str, facts: Optional[PageFacts] = None) -> Dict:
         """
         Trích xuất từ HTML structure và meta tags
         """
         result = {}
 
-        # Xác định config dựa trên domain
+        facts = facts or collect_facts(soup)
+
+        # Xác định plan (selectors đã biên dịch) dựa trên domain
         domain = urlparse(url).netloc
-        config = self.site_configs.get(domain, self.site_configs["default"])
+        plan = get_extraction_plan(domain)
         
         # Extract từ meta tags (Open Graph, Twitter Card)
-        result.update(self._extract_from_meta_tags(soup))
+        result.update(self._extract_from_meta_tags(soup, facts))
 
         # Extract từ microdata
-        result.update(self._extract_from_microdata(soup))
+        result.update(self._extract_from_microdata(soup, facts))
 
         # Extract bằng regex patterns
         html_text = soup.get_text()
@@ -374,7 +450,7 @@ class UniversalProductScraper:
         #     f.write(html_text)
         for field, patterns in self.universal_patterns.items():
             for pattern in patterns:
-                match = re.search(pattern, html_text, re.IGNORECASE)
+                match = pattern.search(html_text)
                 if match:
                     try:
                         # Tìm group đầu tiên không phải None
@@ -393,13 +469,13 @@ class UniversalProductScraper:
                         print(f"❌ Error extracting: {e}")
                         continue
                 else:
-                    print(f"⚠️ pattern '{pattern}' - no match")    
+                    print(f"⚠️ pattern '{pattern.pattern}' - no match")    
 
         # Extract theo selectors
-        for field, selectors in config["selectors"].items():
+        for field, selectors in plan.selectors:
             for selector in selectors:
-                # print("selector:", selector)
-                elements = soup.select(selector)
+                # print("selector:", selector.pattern)
+                elements = selector.select(soup)
                 if elements:
                     # print(f"elements {field}:", elements)\
                     try:
@@ -428,16 +504,18 @@ class UniversalProductScraper:
                             #     result[field] = elements[0].get_text(strip=True)
                             #     break      
                     except Exception as e:
-                        print(f"❌ Error extracting with selector {selector}: {e}")
+                        print(f"❌ Error extracting with selector {selector.pattern}: {e}")
 
         return result
 
-    def _extract_from_meta_tags(self, soup: BeautifulSoup) -> Dict:
+    def _extract_from_meta_tags(self, soup: BeautifulSoup, facts: Optional[PageFacts] = None) -> Dict:
         """
         Trích xuất từ Open Graph và Twitter Card meta tags
         """
         result = {}
 
+        facts = facts or collect_facts(soup)
+
         # Open Graph tags
         og_mapping = {
             "og:title": "name",
@@ -448,12 +526,12 @@ class UniversalProductScraper:
         }
 
         for og_prop, field in og_mapping.items():
-            tag = soup.find("meta", property=og_prop)
-            if tag and tag.get("content"):
+            content = facts.meta_property.get(og_prop)
+            if content:
                 if field == "images":
-                    result.setdefault("images", []).append(tag["content"])
+                    result.setdefault("images", []).append(content)
                 else:
-                    result[field] = tag["content"]
+                    result[field] = content
 
         # Twitter Card
         twitter_mapping = {
@@ -464,24 +542,26 @@ class UniversalProductScraper:
 
         for tw_name, field in twitter_mapping.items():
             if field not in result or field == "images":
-                tag = soup.find("meta", attrs={"name": tw_name})
-                if tag and tag.get("content"):
-                    # print("tag content:", tag["content"], tag.get("content"))
+                content = facts.meta_name.get(tw_name)
+                if content:
+                    # print("tag content:", content)
                     # if field == "images":
-                        print("tag twitter image:", result[field], tag["content"])
-                        result[field].append(tag["content"])
+                        print("tag twitter image:", result[field], content)
+                        result[field].append(content)
                         print("result images twitter:", result["images"])
                     # else:
                     #     result[field] = tag["content"]
 
         return result
 
-    def _extract_from_microdata(self, soup: BeautifulSoup) -> Dict:
+    def _extract_from_microdata(self, soup: BeautifulSoup, facts: Optional[PageFacts] = None) -> Dict:
         """
         Trích xuất từ microdata (itemprop)
         """
         result = {}
 
+        facts = facts or collect_facts(soup)
+
         mapping = {
             "name": "name",
             "description": "description",
@@ -493,7 +573,7 @@ class UniversalProductScraper:
         }
 
         for itemprop, field in mapping.items():
-            element = soup.find(attrs={"itemprop": itemprop})
+            element = facts.itemprops.get(itemprop)
             if element:
                 if element.name == "meta":
                     value = element.get("content")
@@ -523,7 +603,7 @@ class UniversalProductScraper:
             return {"error": "LLM API key not provided"}
 
         # Clean HTML
-        soup = BeautifulSoup(html_content, "html.parser")
+        soup = make_soup(html_content)
         for tag in soup(["script", "style", "nav", "footer", "header"]):
             tag.decompose()
 
@@ -572,19 +652,21 @@ Chỉ trả về JSON, không giải thích.
             print(f"❌ LLM extraction failed: {e}")
             return {"error": str(e)}
 
-    def _extract_hybrid(self, soup: BeautifulSoup, html_content: str) -> Dict:
+    def _extract_hybrid(self, soup: BeautifulSoup, html_content: str, facts: Optional[PageFacts] = None) -> Dict:
         """
         Kết hợp nhiều phương pháp để đạt độ chính xác cao nhất
         """
         result = {}
 
+        facts = facts or collect_facts(soup)
+
         # 1. JSON-LD (ưu tiên cao nhất)
-        json_ld_data = self._extract_from_json_ld(soup)
+        json_ld_data = self._extract_from_json_ld(soup, facts)
         result.update(json_ld_data)
         print("keys json_ld_data:", json_ld_data.keys())
 
         # 2. HTML structure
-        html_data = self._extract_from_html(soup, "")
+        html_data = self._extract_from_html(soup, "", facts)
         for key, value in html_data.items():
             if key not in result or not result[key] or key == "price" or key == "images":
                 result[key] = value
@@ -626,22 +708,22 @@ Chỉ trả về JSON, không giải thích.
                 # decode HTML entities và strip tags
                 decoded = html.unescape(value)
                 print("decoded:", decoded)
-                soup = BeautifulSoup(decoded, "html.parser")
+                soup = make_soup(decoded)
                 text = soup.get_text(separator=" ").strip()
 
                 # loại bỏ ký tự không phải chữ/số/khoảng trắng/.,:;()-/%°
-                cleaned_value = re.sub(r"[^0-9A-Za-zÀ-ỹà-ỹ\s\.,:;\(\)\-\–\/%°]+", "", text)
+                cleaned_value = DISALLOWED_CHARS_RE.sub("", text)
 
                 # gộp nhiều khoảng trắng thành một
-                cleaned_value = re.sub(r"\s+", " ", cleaned_value).strip()
+                cleaned_value = WHITESPACE_RE.sub(" ", cleaned_value).strip()
 
                 # Remove HTML tags
-                value = re.sub(r"<[^>]+>", "", cleaned_value)
+                value = HTML_TAG_RE.sub("", cleaned_value)
 
             # Clean price
             if key == "price" and isinstance(value, str):
                 # Extract numbers
-                price_match = re.search(r"([\d.,]+)", value.replace(",", ""))
+                price_match = NUMBER_RE.search(value.replace(",", ""))
                 if price_match:
                     cleaned[key] = price_match.group(1)
                     # Extract currency
@@ -654,18 +736,40 @@ Chỉ trả về JSON, không giải thích.
 
         return cleaned
 
+    async def scrape_batch(
+        self,
+        urls: List[str],
+        method: str = "auto",
+        max_concurrency: int = SCRAPE_CONCURRENCY,
+    ) -> AsyncIterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Scrape nhiều URL song song, trả về (url, result) theo thứ tự hoàn thành.
+        Mỗi domain được giới hạn tốc độ bằng token bucket riêng (tránh bị ban)
+        """
+
+        async def _scrape(url: str):
+            try:
+                return await self.ascrape(url, method)
+            except Exception as e:
+                print(f"❌ Error: {e}, url: {url}")
+                return None
+
+        done = 0
+        async for url, result in rate_limited_batch(urls, _scrape, max_concurrency):
+            done += 1
+            print(f"📦 Sản phẩm {done}/{len(urls)}: {url}")
+            yield url, result
+
     def scrape_multiple(self, urls: List[str]) -> List[Dict]:
         """
-        Scrape nhiều URL
+        Scrape nhiều URL (đồng bộ), kết quả giữ nguyên thứ tự của urls
         """
-        results = []
-        for i, url in enumerate(urls, 1):
-            print(f"\n{'=' * 60}")
-            print(f"📦 Sản phẩm {i}/{len(urls)}")
-            result = self.scrape(url)
-            results.append(result)
-            time.sleep(1)  # Tránh bị ban
-        return results
+
+        async def _collect():
+            return {url: result async for url, result in self.scrape_batch(urls)}
+
+        results = asyncio.run(_collect())
+        return [results.get(url) for url in urls]
 
     def save_results(self, results: List[Dict], filename: str = "products.json"):
         """
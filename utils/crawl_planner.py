@@ -0,0 +1,84 @@
+import os
+import unicodedata
+from dataclasses import dataclass
+from typing import List, Optional
+
+from crawl4ai.deep_crawling import BestFirstCrawlingStrategy
+from crawl4ai.deep_crawling.filters import FilterChain
+from crawl4ai.deep_crawling.scorers import CompositeScorer, KeywordRelevanceScorer, URLScorer
+
+from utils.link_prefilter import LinkPrefilter
+
+# Per-job budgets of a deep crawl
+DEEP_CRAWL_MAX_DEPTH = int(os.getenv("DEEP_CRAWL_MAX_DEPTH", "2"))
+DEEP_CRAWL_MAX_PAGES = int(os.getenv("DEEP_CRAWL_MAX_PAGES", "100"))
+DEEP_CRAWL_TIME_BUDGET = float(os.getenv("DEEP_CRAWL_TIME_BUDGET", "300"))
+# Stop once this many products were extracted (0 = crawl the whole budget)
+DEEP_CRAWL_TARGET_PRODUCTS = int(os.getenv("DEEP_CRAWL_TARGET_PRODUCTS", "200"))
+# Frontier ordering: weight of the query keywords in the URL vs. the product URL shape
+DEEP_CRAWL_QUERY_WEIGHT = float(os.getenv("DEEP_CRAWL_QUERY_WEIGHT", "0.7"))
+DEEP_CRAWL_SHAPE_WEIGHT = float(os.getenv("DEEP_CRAWL_SHAPE_WEIGHT", "0.3"))
+# Links scoring below this are not crawled
+DEEP_CRAWL_SCORE_THRESHOLD = float(os.getenv("DEEP_CRAWL_SCORE_THRESHOLD", "0"))
+# Score of a URL shape without enough history
+UNKNOWN_SHAPE_SCORE = 0.5
+# Per URL shape: how often a deep-crawled page yielded products with the site
+# schema. Listing pages count too, so this is kept apart from the link
+# prefilter's product-page history.
+DEEP_CRAWL_SHAPES_PATH = os.getenv("DEEP_CRAWL_SHAPES_PATH", "./schema_cache/deep_crawl_shapes.json")
+
+
+@dataclass(frozen=True)
+class CrawlBudget:
+    max_depth: int = DEEP_CRAWL_MAX_DEPTH
+    max_pages: int = DEEP_CRAWL_MAX_PAGES
+    time_budget: float = DEEP_CRAWL_TIME_BUDGET
+    target_products: int = DEEP_CRAWL_TARGET_PRODUCTS
+
+    def enough(self, products: int) -> bool:
+        return 0 < self.target_products <= products
+
+
+yield_history = LinkPrefilter(path=DEEP_CRAWL_SHAPES_PATH)
+
+
+def query_keywords(query: str) -> List[str]:
+    """
+    Query tokens as they appear in URL slugs: lowercase, without Vietnamese
+    diacritics, e.g. 'Đèn bàn LED' -> ['den', 'ban', 'led'].
+    """
+    text = unicodedata.normalize("NFD", query.lower().replace("đ", "d"))
+    text = "".join(c for c in text if unicodedata.category(c) != "Mn")
+    return [token for token in dict.fromkeys(text.split()) if len(token) > 1]
+
+
+class ProductShapeScorer(URLScorer):
+    """Scores a link by how often pages of its URL shape yielded products."""
+
+    def __init__(self, history: Optional[LinkPrefilter] = None, weight: float = 1.0):
+        super().__init__(weight=weight)
+        self.history = history or yield_history
+
+    def _calculate_score(self, url: str) -> float:
+        ratio = self.history.product_ratio(url)
+        return UNKNOWN_SHAPE_SCORE if ratio is None else ratio
+
+
+def plan_deep_crawl(
+    query: str,
+    budget: CrawlBudget,
+    filter_chain: Optional[FilterChain] = None,
+) -> BestFirstCrawlingStrategy:
+    """Best-first strategy visiting the links most likely to be matching product pages first."""
+    scorers = [ProductShapeScorer(weight=DEEP_CRAWL_SHAPE_WEIGHT)]
+    keywords = query_keywords(query)
+    if keywords:
+        scorers.append(KeywordRelevanceScorer(keywords=keywords, weight=DEEP_CRAWL_QUERY_WEIGHT))
+    return BestFirstCrawlingStrategy(
+        max_depth=budget.max_depth,
+        include_external=False,
+        filter_chain=filter_chain or FilterChain([]),
+        url_scorer=CompositeScorer(scorers, normalize=False),
+        score_threshold=DEEP_CRAWL_SCORE_THRESHOLD,
+        max_pages=budget.max_pages,
+    )
@@ -0,0 +1,183 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from crawl4ai import AsyncWebCrawler, BrowserConfig
+
+from utils.http_cache import get_http_cache
+from utils.rate_limit import scheduler
+
+
+async def _serve_document(route):
+    """Answer a page navigation from the shared HTTP cache, revalidating when stale."""
+    request = route.request
+    url = request.url
+    try:
+        if request.method != "GET":
+            await route.continue_()
+            return
+        cache = get_http_cache()
+        entry, headers = await asyncio.to_thread(cache.prepare, url, request.headers)
+        if entry is not None and entry.fresh:
+            await route.fulfill(status=200, content_type=entry.content_type, body=entry.body)
+            return
+
+        async with scheduler.slot(url) as permit:
+            response = await route.fetch(headers=headers)
+            permit.record(response.status, response.headers)
+        body = await response.body()
+        cached = await asyncio.to_thread(
+            cache.resolve, url, entry, response.status, response.headers, body
+        )
+        if response.status == 304 and cached is not None:
+            await route.fulfill(status=200, content_type=entry.content_type, body=cached)
+        else:
+            await route.fulfill(response=response, body=body)
+    except Exception as e:
+        print(f"Error serving {url} from cache: {e}")
+        try:
+            await route.continue_()
+        except Exception:
+            pass
+
+
+async def _before_goto(page, context=None, url: str = "", **kwargs):
+    if not url.startswith("http"):
+        return page
+    if get_http_cache() is not None:
+        # The document request goes through the cache (and the scheduler when
+        # it reaches the network); subresources are left to the browser
+        await page.route(lambda request_url: request_url == url, _serve_document)
+    else:
+        # Pace only: the slot is released right away, the pool's
+        # max_concurrency already bounds open pages and after_goto is not
+        # called when navigation fails
+        async with scheduler.slot(url):
+            pass
+    return page
+
+
+async def _after_goto(page, context=None, url: str = "", response=None, **kwargs):
+    # With the cache enabled _serve_document already reported the status
+    if response is not None and url.startswith("http") and get_http_cache() is None:
+        scheduler.record(url, response.status, response.headers.get("retry-after"))
+    return page
+
+
+class _PooledCrawler:
+    def __init__(self, crawler: AsyncWebCrawler):
+        self.crawler = crawler
+        self.uses = 0
+        self.active = 0
+        self.retiring = False
+        # Browser launch, awaited by leases outside the pool lock
+        self.ready = asyncio.ensure_future(crawler.start())
+
+
+class CrawlerPool:
+    """
+    Application-scoped pool of started AsyncWebCrawler instances.
+
+    Each crawler keeps its browser alive between requests and is recycled
+    after `max_uses` leases. `max_concurrency` bounds the number of leases
+    handed out at the same time across the whole pool. The lock only guards
+    the bookkeeping; browsers are launched and closed outside of it.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        max_uses: int = 50,
+        max_concurrency: int = 8,
+        browser_config: Optional[BrowserConfig] = None,
+    ):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_concurrency = max_concurrency
+        self.browser_config = browser_config or BrowserConfig(headless=True)
+        self._entries: List[_PooledCrawler] = []
+        self._lock = asyncio.Lock()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._started = False
+
+    def _new_entry(self) -> _PooledCrawler:
+        crawler = AsyncWebCrawler(config=self.browser_config)
+        crawler.crawler_strategy.set_hook("before_goto", _before_goto)
+        crawler.crawler_strategy.set_hook("after_goto", _after_goto)
+        return _PooledCrawler(crawler)
+
+    @staticmethod
+    async def _close_entry(entry: _PooledCrawler):
+        try:
+            await entry.ready
+            await entry.crawler.close()
+        except Exception as e:
+            print(f"Error closing crawler: {e}")
+
+    async def start(self):
+        async with self._lock:
+            if self._started:
+                return
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._entries = [self._new_entry() for _ in range(self.size)]
+            self._started = True
+            entries = list(self._entries)
+        await asyncio.gather(*[entry.ready for entry in entries], return_exceptions=True)
+        print(f"Crawler pool started with {self.size} browsers")
+
+    async def close(self):
+        async with self._lock:
+            entries, self._entries = self._entries, []
+            self._started = False
+        for entry in entries:
+            await self._close_entry(entry)
+
+    def _retire(self, entry: _PooledCrawler):
+        """Take `entry` out of the pool, launching a replacement if needed."""
+        print(f"Recycling crawler after {entry.uses} uses")
+        self._entries.remove(entry)
+        if len([e for e in self._entries if not e.retiring]) < self.size:
+            self._entries.append(self._new_entry())
+
+    @asynccontextmanager
+    async def crawler(self):
+        """Lease a started crawler. Do not close it; return it by leaving the block."""
+        if not self._started:
+            await self.start()
+
+        async with self._sem:
+            async with self._lock:
+                candidates = [e for e in self._entries if not e.retiring]
+                if not candidates:
+                    self._entries.append(self._new_entry())
+                    candidates = self._entries[-1:]
+                entry = min(candidates, key=lambda e: e.active)
+                entry.uses += 1
+                entry.active += 1
+                if entry.uses >= self.max_uses:
+                    entry.retiring = True
+            try:
+                try:
+                    await asyncio.shield(entry.ready)
+                except Exception:
+                    # The browser failed to launch: replace it
+                    entry.retiring = True
+                    raise
+                yield entry.crawler
+            finally:
+                retired = False
+                async with self._lock:
+                    entry.active -= 1
+                    if entry.retiring and entry.active == 0 and entry in self._entries:
+                        self._retire(entry)
+                        retired = True
+                if retired:
+                    await self._close_entry(entry)
+
+
+crawler_pool = CrawlerPool(
+    size=int(os.getenv("CRAWLER_POOL_SIZE", "2")),
+    max_uses=int(os.getenv("CRAWLER_MAX_USES", "50")),
+    max_concurrency=int(os.getenv("CRAWLER_MAX_CONCURRENCY", "8")),
+)
@@ -0,0 +1,51 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+
+# Off by default: capture() is then a no-op with no filesystem I/O at all
+DEBUG_ARTIFACTS = os.getenv("DEBUG_ARTIFACTS", "0") == "1"
+DEBUG_ARTIFACTS_DIR = os.getenv("DEBUG_ARTIFACTS_DIR", "./debug_artifacts")
+DEBUG_ARTIFACTS_MAX_FILES = int(os.getenv("DEBUG_ARTIFACTS_MAX_FILES", "200"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _write(name: str, content: str):
+    try:
+        os.makedirs(DEBUG_ARTIFACTS_DIR, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:8]}_{name}"
+        with open(os.path.join(DEBUG_ARTIFACTS_DIR, filename), "w", encoding="utf-8") as f:
+            f.write(content)
+        _prune()
+    except Exception as e:
+        print(f"Error writing debug artifact {name}: {e}")
+
+
+def _prune():
+    """Keep the spool directory bounded by dropping the oldest files."""
+    paths = [os.path.join(DEBUG_ARTIFACTS_DIR, f) for f in os.listdir(DEBUG_ARTIFACTS_DIR)]
+    if len(paths) <= DEBUG_ARTIFACTS_MAX_FILES:
+        return
+    paths.sort(key=os.path.getmtime)
+    for path in paths[: len(paths) - DEBUG_ARTIFACTS_MAX_FILES]:
+        os.remove(path)
+
+
+def capture(name: str, content: Union[str, Callable[[], str]]):
+    """
+    Save a per-request debug file (sample HTML, generated schema, ...).
+
+    `content` may be a callable so that expensive serialization such as
+    str(soup) is skipped entirely when capture is disabled. Writes happen on
+    a background thread, never on the request path.
+    """
+    global _executor
+    if not DEBUG_ARTIFACTS:
+        return
+    if callable(content):
+        content = content()
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-artifacts")
+    _executor.submit(_write, name, content)
@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Dict, List
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "mxbai-embed-large:latest")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./embedding_cache.sqlite3")
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    OllamaEmbeddings with batching, an on-disk cache and in-flight de-duplication.
+
+    Vectors are cached in SQLite keyed by a hash of (model, text), so
+    re-indexing a site only embeds the texts that changed. Identical texts
+    requested concurrently are embedded once.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBEDDING_MODEL,
+        cache_path: str = EMBEDDING_CACHE_PATH,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+    ):
+        self.model = model
+        self.batch_size = batch_size
+        self._inner = OllamaEmbeddings(model=model)
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+        )
+        self._db.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    chunk,
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()],
+            )
+            self._db.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors = self._load(list(set(keys)))
+
+        # Claim the missing texts, or wait on another caller already embedding them
+        owned: Dict[str, str] = {}
+        waiting: Dict[str, Future] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in vectors or key in owned or key in waiting:
+                    continue
+                if key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                else:
+                    self._inflight[key] = Future()
+                    owned[key] = text
+
+        if owned:
+            print(f"Embedding {len(owned)} new texts ({len(texts) - len(owned)} reused)")
+        owned_keys = list(owned)
+        try:
+            for i in range(0, len(owned_keys), self.batch_size):
+                batch = owned_keys[i : i + self.batch_size]
+                embedded = self._inner.embed_documents([owned[key] for key in batch])
+                batch_vectors = dict(zip(batch, embedded))
+                self._store(batch_vectors)
+                vectors.update(batch_vectors)
+                with self._lock:
+                    for key in batch:
+                        self._inflight.pop(key).set_result(batch_vectors[key])
+        except Exception as e:
+            with self._lock:
+                for key in owned_keys:
+                    future = self._inflight.pop(key, None)
+                    if future is not None:
+                        future.set_exception(e)
+            raise
+
+        for key, future in waiting.items():
+            vectors[key] = future.result()
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+
+@lru_cache(maxsize=None)
+def get_embeddings(model: str = EMBEDDING_MODEL) -> CachedEmbeddings:
+    """Shared embedding service for the whole process."""
+    return CachedEmbeddings(model=model)
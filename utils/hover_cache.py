@@ -0,0 +1,53 @@
+import asyncio
+from typing import Any, Awaitable, Callable, List
+
+from utils.async_cache import SingleFlight, TTLCache
+from utils.canonical_url import canonical_url
+
+
+class HoverCache:
+    """
+    Product-detail cache for /hover.
+
+    Entries are keyed by canonical URL, expire after `ttl` seconds and are
+    evicted LRU beyond `max_entries`. Concurrent requests for the same URL
+    share a single fetch (single-flight).
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str], Awaitable[Any]],
+        ttl: float = 600,
+        max_entries: int = 1024,
+    ):
+        self.fetcher = fetcher
+        self._entries = TTLCache(ttl, max_entries)
+        self._flight = SingleFlight()
+
+    async def get(self, url: str) -> Any:
+        key = canonical_url(url)
+        value = self._entries.get(key)
+        if value is not None:
+            return value
+
+        async def _fetch():
+            value = await self.fetcher(url)
+            # Failed scrapes are not cached, the next hover retries them
+            if value:
+                self._entries.put(key, value)
+            return value
+
+        return await self._flight.do(key, _fetch)
+
+    async def warm(self, urls: List[str], concurrency: int = 4):
+        """Pre-fetch product pages, e.g. the links of a result set just sent."""
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _warm_one(url: str):
+            async with sem:
+                try:
+                    await self.get(url)
+                except Exception as e:
+                    print(f"Error warming {url}: {e}")
+
+        await asyncio.gather(*[_warm_one(url) for url in dict.fromkeys(urls) if url])
@@ -0,0 +1,59 @@
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup, Tag
+
+try:
+    import lxml  # noqa: F401
+
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+# Backend used by BeautifulSoup: "lxml" (fast, default when installed),
+# "html.parser" (pure Python) or "html5lib"
+HTML_PARSER = os.getenv("HTML_PARSER", DEFAULT_PARSER)
+
+
+def make_soup(markup: str, parser: Optional[str] = None) -> BeautifulSoup:
+    return BeautifulSoup(markup, parser or HTML_PARSER)
+
+
+@dataclass
+class PageFacts:
+    """
+    Structured data collected from a page in a single DOM pass.
+
+    `meta_property` / `meta_name` map a meta property or name to the content
+    of its first occurrence (None when the tag has no content), and
+    `itemprops` maps an itemprop to its first element, i.e. what
+    soup.find(...) returned for each lookup.
+    """
+
+    json_ld: List[str] = field(default_factory=list)
+    meta_property: Dict[str, Optional[str]] = field(default_factory=dict)
+    meta_name: Dict[str, Optional[str]] = field(default_factory=dict)
+    itemprops: Dict[str, Tag] = field(default_factory=dict)
+
+
+def collect_facts(soup: BeautifulSoup) -> PageFacts:
+    """Collect JSON-LD scripts, meta tags and itemprops in one traversal."""
+    facts = PageFacts()
+    for element in soup.find_all(True):
+        name = element.name
+        if name == "script":
+            if element.get("type") == "application/ld+json":
+                facts.json_ld.append(element.string or "")
+        elif name == "meta":
+            prop = element.get("property")
+            if prop and prop not in facts.meta_property:
+                facts.meta_property[prop] = element.get("content")
+            meta_name = element.get("name")
+            if meta_name and meta_name not in facts.meta_name:
+                facts.meta_name[meta_name] = element.get("content")
+
+        itemprop = element.get("itemprop")
+        if itemprop and itemprop not in facts.itemprops:
+            facts.itemprops[itemprop] = element
+    return facts
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Tuple
+from urllib.parse import urlparse
+
+from utils.canonical_url import canonical_url
+
+HTTP_CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "./http_cache")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Seconds a response is served without revalidation, and per-site overrides
+# as "host=seconds,host=seconds" (a host also covers its subdomains)
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", "3600"))
+HTTP_CACHE_SITE_TTLS = os.getenv("HTTP_CACHE_SITE_TTLS", "")
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "1") == "1"
+
+
+def _parse_site_ttls(value: str) -> Dict[str, float]:
+    ttls = {}
+    for item in value.split(","):
+        host, _, seconds = item.partition("=")
+        if host.strip() and seconds.strip():
+            ttls[host.strip().lower()] = float(seconds)
+    return ttls
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    body: bytes
+    content_type: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fresh: bool
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Shared on-disk HTTP cache.
+
+    Bodies are stored once per content hash under `bodies/`, and a SQLite
+    index maps each URL to its body, validators and timestamps. Entries
+    younger than the site's TTL are served directly. Older ones are
+    revalidated with If-None-Match / If-Modified-Since, and a 304 refreshes
+    them. The total body size is kept under `max_bytes` by evicting the
+    least recently used URLs.
+    """
+
+    def __init__(
+        self,
+        directory: str = HTTP_CACHE_DIR,
+        max_bytes: int = HTTP_CACHE_MAX_BYTES,
+        ttl: float = HTTP_CACHE_TTL,
+        site_ttls: Optional[Dict[str, float]] = None,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.site_ttls = _parse_site_ttls(HTTP_CACHE_SITE_TTLS) if site_ttls is None else site_ttls
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, "bodies"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "url TEXT PRIMARY KEY, body_hash TEXT, size INTEGER, content_type TEXT, "
+            "etag TEXT, last_modified TEXT, stored_at REAL, accessed_at REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+        self._db.commit()
+
+    def ttl_for(self, url: str) -> float:
+        host = urlparse(url).netloc.lower().split(":")[0]
+        parts = host.split(".")
+        for i in range(len(parts) - 1):
+            ttl = self.site_ttls.get(".".join(parts[i:]))
+            if ttl is not None:
+                return ttl
+        return self.ttl
+
+    def _body_path(self, body_hash: str) -> str:
+        return os.path.join(self.directory, "bodies", body_hash[:2], body_hash)
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        # Tracking-parameter variants of a page share one entry
+        url = canonical_url(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT body_hash, content_type, etag, last_modified, stored_at FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            body_hash, content_type, etag, last_modified, stored_at = row
+            try:
+                with open(self._body_path(body_hash), "rb") as f:
+                    body = f.read()
+            except FileNotFoundError:
+                self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+        fresh = time.time() - stored_at < self.ttl_for(url)
+        return CachedResponse(url, body, content_type, etag, last_modified, fresh)
+
+    def store(self, url: str, body: bytes, headers: Mapping[str, str]):
+        cache_control = (headers.get("cache-control") or "").lower()
+        if "no-store" in cache_control:
+            return
+        url = canonical_url(url)
+        body_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(body_hash)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, path)
+            old = self._db.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            now = time.time()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    body_hash,
+                    len(body),
+                    headers.get("content-type"),
+                    headers.get("etag"),
+                    headers.get("last-modified"),
+                    now,
+                    now,
+                ),
+            )
+            if old and old[0] != body_hash:
+                self._drop_body_if_unused(old[0])
+            self._evict()
+            self._db.commit()
+
+    def refresh(self, url: str):
+        """The origin answered 304: the cached body is fresh again."""
+        url = canonical_url(url)
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "UPDATE entries SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url)
+            )
+            self._db.commit()
+
+    def _drop_body_if_unused(self, body_hash: str):
+        if self._db.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+            return
+        try:
+            os.remove(self._body_path(body_hash))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        # Shared bodies are counted once
+        (total,) = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT body_hash, size FROM entries)"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        for url, body_hash in self._db.execute(
+            "SELECT url, body_hash FROM entries ORDER BY accessed_at"
+        ).fetchall():
+            self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+            if not self._db.execute(
+                "SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)
+            ).fetchone():
+                path = self._body_path(body_hash)
+                try:
+                    total -= os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            if total <= self.max_bytes:
+                break
+
+    def prepare(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Tuple[Optional[CachedResponse], Dict[str, str]]:
+        """Cached entry for `url` and the request headers to send if it is not fresh."""
+        entry = self.lookup(url)
+        headers = dict(headers or {})
+        if entry is not None and not entry.fresh:
+            headers.update(entry.conditional_headers())
+        return entry, headers
+
+    def resolve(
+        self,
+        url: str,
+        entry: Optional[CachedResponse],
+        status: int,
+        headers: Mapping[str, str],
+        body: bytes,
+    ) -> Optional[bytes]:
+        """Body to use for a response: the cached one on 304, the new one (stored) on 200."""
+        if status == 304 and entry is not None:
+            self.refresh(url)
+            return entry.body
+        if status == 200:
+            self.store(url, body, headers)
+            return body
+        return None
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Process-wide cache, or None when HTTP_CACHE_ENABLED=0."""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache()
+    return _cache
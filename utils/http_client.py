@@ -0,0 +1,132 @@
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+import httpx
+import requests
+
+from utils.http_cache import get_http_cache
+from utils.rate_limit import THROTTLE_STATUSES, scheduler
+
+try:
+    import h2  # noqa: F401
+
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Process-wide AsyncClient.
+
+    httpx keeps a keep-alive connection pool per origin (HTTP/2 when the
+    `h2` package is installed), so repeated fetches from the same shop reuse
+    the TCP/TLS connection instead of handshaking every time.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2,
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=30,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _decode(body: bytes) -> str:
+    # Fix encoding UTF-8
+    return body.decode("utf-8", errors="replace")
+
+
+async def fetch_text(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    max_retries: int = 3,
+    backoff: float = 2.0,
+) -> Optional[str]:
+    """
+    Fetch a page as UTF-8 text through the HTTP cache and the domain scheduler.
+
+    Fresh cached pages are returned without a request, stale ones are
+    revalidated with a conditional GET. Throttled responses (403/429/503)
+    are retried; the scheduler slows the host down and honours Retry-After
+    before the next attempt goes out. Network errors are retried after
+    `backoff` seconds.
+    """
+    cache = get_http_cache()
+    entry = None
+    if cache is not None:
+        entry, headers = await asyncio.to_thread(cache.prepare, url, headers)
+        if entry is not None and entry.fresh:
+            return _decode(entry.body)
+
+    for i in range(max_retries):
+        try:
+            async with scheduler.slot(url) as permit:
+                response = await get_client().get(url, headers=headers)
+                permit.record(response.status_code, response.headers)
+            if response.status_code == 200 or (response.status_code == 304 and entry is not None):
+                body = response.content
+                if cache is not None:
+                    body = await asyncio.to_thread(
+                        cache.resolve, url, entry, response.status_code, response.headers, body
+                    )
+                return _decode(body)
+            elif response.status_code in THROTTLE_STATUSES:
+                print(f"⚠️  Bị chặn, thử lại lần {i + 1}...")
+            else:
+                print(f"❌ Status code: {response.status_code}, url: {url}")
+                return None
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            if i < max_retries - 1:
+                await asyncio.sleep(backoff)
+    return None
+
+
+def get_text_sync(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = HTTP_TIMEOUT,
+) -> Tuple[int, str]:
+    """
+    Blocking single GET for the requests-based scrapers, sharing the HTTP
+    cache and the domain scheduler with fetch_text. Returns (status, text);
+    a 304 against the cache comes back as (200, cached text).
+    """
+    cache = get_http_cache()
+    entry = None
+    if cache is not None:
+        entry, headers = cache.prepare(url, headers)
+        if entry is not None and entry.fresh:
+            return 200, _decode(entry.body)
+
+    with scheduler.slot_sync(url) as permit:
+        response = requests.get(url, headers=headers, timeout=timeout)
+        permit.record(response.status_code, response.headers)
+
+    body = response.content
+    if response.status_code == 304 and entry is not None:
+        return 200, _decode(cache.resolve(url, entry, 304, response.headers, body))
+    if cache is not None:
+        cache.resolve(url, entry, response.status_code, response.headers, body)
+    return response.status_code, _decode(body)
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class IndexQueue:
+    """
+    Background queue for site indexing jobs (deep crawl + vector store).
+
+    Jobs are de-duplicated per site: enqueueing a site that is already
+    queued or running is a no-op, so concurrent users searching the same
+    new site trigger a single crawl.
+    """
+
+    def __init__(self, handler: Callable[[str, str], Awaitable[Any]], workers: int = 1):
+        self.handler = handler
+        self.workers = workers
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        print(f"Index queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, root_url: str, query: str) -> bool:
+        """Queue a site for indexing. Returns False if it is already pending."""
+        if self._queue is None:
+            self.start()
+
+        job = self._jobs.get(root_url)
+        if job and job["state"] in ("queued", "running"):
+            print(f"Indexing of {root_url} already {job['state']}, skipping")
+            return False
+
+        self._jobs[root_url] = {
+            "state": "queued",
+            "query": query,
+            "queued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+        self._queue.put_nowait((root_url, query))
+        return True
+
+    def status(self, root_url: Optional[str] = None) -> Dict[str, Any]:
+        if root_url is not None:
+            return self._jobs.get(root_url, {"state": "unknown"})
+        return {
+            "workers": self.workers,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "jobs": self._jobs,
+        }
+
+    async def _worker(self, worker_id: int):
+        while True:
+            root_url, query = await self._queue.get()
+            job = self._jobs[root_url]
+            job["state"] = "running"
+            job["started_at"] = time.time()
+            print(f"[index worker {worker_id}] Indexing {root_url} for '{query}'")
+            try:
+                await self.handler(root_url, query)
+                job["state"] = "done"
+            except Exception as e:
+                print(f"[index worker {worker_id}] Error indexing {root_url}: {e}")
+                job["state"] = "failed"
+                job["error"] = str(e)
+            finally:
+                job["finished_at"] = time.time()
+                self._queue.task_done()
@@ -0,0 +1,146 @@
+import asyncio
+import html
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+from urllib.parse import urlparse
+
+from utils.http_client import fetch_text
+from utils.schema_store import atomic_write_json
+
+# Text that only product pages carry
+PRODUCT_MARKER = "Giá bán lẻ đề xuất"
+
+LINK_PREFILTER = os.getenv("LINK_PREFILTER", "1") == "1"
+LINK_SHAPES_PATH = os.getenv("LINK_SHAPES_PATH", "./schema_cache/link_shapes.json")
+PREFILTER_CONCURRENCY = int(os.getenv("PREFILTER_CONCURRENCY", "8"))
+# Observations of a URL shape needed before it is trusted, and the share of
+# product pages above which the shape counts as a product page
+SHAPE_MIN_SAMPLES = int(os.getenv("SHAPE_MIN_SAMPLES", "3"))
+SHAPE_PRODUCT_RATIO = float(os.getenv("SHAPE_PRODUCT_RATIO", "0.5"))
+
+_DIGITS = re.compile(r"\d+")
+
+
+def url_shape(url: str) -> str:
+    """
+    Generalized form of a URL: digits become '#', and the last path segment
+    keeps only its final '-' token, e.g.
+    'https://rangdong.com.vn/den-ban-led-pr1716.html' -> 'rangdong.com.vn/*-pr#.html'.
+    """
+    parsed = urlparse(url)
+    segments = [_DIGITS.sub("#", s) for s in parsed.path.strip("/").split("/") if s]
+    if segments:
+        last = segments[-1]
+        segments[-1] = f"*-{last.rsplit('-', 1)[-1]}" if "-" in last else last
+    return "/".join([parsed.netloc.lower(), *segments])
+
+
+class LinkPrefilter:
+    """
+    Decides which links are worth a full JS render.
+
+    A link whose URL shape has been seen often enough is classified from
+    past outcomes. Other links get a plain HTTP fetch (through the shared
+    cache) checked for the product marker. A missing marker only counts
+    on hosts whose raw HTML has carried it before; elsewhere the page may
+    be rendered client-side, so the browser render decides. Every outcome,
+    including the rendered ones, is recorded per shape and persisted.
+    """
+
+    def __init__(self, path: str = LINK_SHAPES_PATH, concurrency: int = PREFILTER_CONCURRENCY):
+        self.path = Path(path)
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+        self._shapes: Dict[str, List[int]] = {}
+        # Hosts whose product pages carry the marker without JS rendering
+        self._raw_marker_hosts: Set[str] = set()
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+                # Older files (shapes only) may hold negatives learned from
+                # raw HTML of JS-rendered hosts: they are not reused
+                if "shapes" in data:
+                    self._shapes = data["shapes"]
+                    self._raw_marker_hosts = set(data.get("raw_marker_hosts", []))
+            except Exception as e:
+                print(f"Error loading {self.path}: {e}")
+
+    def predict(self, url: str) -> Optional[bool]:
+        """True/False for a known shape, None when there is not enough history."""
+        with self._lock:
+            products, total = self._shapes.get(url_shape(url), (0, 0))
+        if total < SHAPE_MIN_SAMPLES:
+            return None
+        return products / total >= SHAPE_PRODUCT_RATIO
+
+    def product_ratio(self, url: str) -> Optional[float]:
+        """Share of product pages seen for the URL's shape, None when there is not enough history."""
+        with self._lock:
+            products, total = self._shapes.get(url_shape(url), (0, 0))
+        if total < SHAPE_MIN_SAMPLES:
+            return None
+        return products / total
+
+    def learn(self, url: str, is_product: bool):
+        with self._lock:
+            counts = self._shapes.setdefault(url_shape(url), [0, 0])
+            counts[0] += int(is_product)
+            counts[1] += 1
+
+    def save(self):
+        with self._lock:
+            data = {"shapes": dict(self._shapes), "raw_marker_hosts": sorted(self._raw_marker_hosts)}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self.path, data)
+
+    async def _fetch_check(self, url: str, sem: asyncio.Semaphore) -> bool:
+        async with sem:
+            text = await fetch_text(url, max_retries=1)
+        if text is None:
+            # Could not tell without a browser: let the render decide
+            return True
+        host = urlparse(url).netloc.lower()
+        if PRODUCT_MARKER in html.unescape(text):
+            with self._lock:
+                self._raw_marker_hosts.add(host)
+            self.learn(url, True)
+            return True
+        with self._lock:
+            conclusive = host in self._raw_marker_hosts
+        if not conclusive:
+            # The marker may only appear after JS rendering: the render decides and learns
+            return True
+        self.learn(url, False)
+        return False
+
+    async def filter(self, urls: List[str], stats: Optional[Dict] = None) -> List[str]:
+        """Links to render, in their original order. Skip counts go to `stats`."""
+        stats = stats if stats is not None else {}
+        stats.setdefault("links", 0)
+        stats.setdefault("skipped_by_shape", 0)
+        stats.setdefault("skipped_by_fetch", 0)
+        stats["links"] += len(urls)
+        if not LINK_PREFILTER:
+            return list(urls)
+
+        predictions = [self.predict(url) for url in urls]
+        unknown = [url for url, p in zip(urls, predictions) if p is None]
+        sem = asyncio.Semaphore(self.concurrency)
+        checked = dict(zip(unknown, await asyncio.gather(*[self._fetch_check(url, sem) for url in unknown])))
+
+        selected = []
+        for url, predicted in zip(urls, predictions):
+            if predicted is False:
+                stats["skipped_by_shape"] += 1
+            elif predicted is None and not checked[url]:
+                stats["skipped_by_fetch"] += 1
+            else:
+                selected.append(url)
+        return selected
+
+
+link_prefilter = LinkPrefilter()
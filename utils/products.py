@@ -0,0 +1,96 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+
+from utils.canonical_url import canonical_url
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    import json
+
+    _loads = json.loads
+
+DESCRIPTION_LIMIT = 200
+
+
+def _text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    return str(value)
+
+
+@dataclass(slots=True)
+class Product:
+    """A product extracted by a crawl4ai schema."""
+
+    name: str
+    link: str
+    description: str = ""
+    image: str = ""
+    price: str = ""
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "name": self.name,
+            "link": self.link,
+            "description": self.description,
+            "image": self.image,
+            "price": self.price,
+        }
+
+    def to_document(self) -> Document:
+        return Document(
+            page_content=self.name + self.description,
+            metadata={
+                "title": self.name,
+                "url": self.link,
+                "image_url": self.image,
+                "description": self.description,
+            },
+        )
+
+
+def decode_products(extracted_content: str, page_url: str) -> List[Product]:
+    """
+    Decode `result.extracted_content` into Product records.
+
+    Items without a title are dropped; other missing fields default to "".
+    """
+    if not extracted_content or extracted_content == "[]":
+        return []
+
+    try:
+        items = _loads(extracted_content)
+    except ValueError as e:
+        print(f"Error decoding extracted content for {page_url}: {e}")
+        return []
+
+    if isinstance(items, dict):
+        items = [items]
+
+    # The same page reached with tracking params must map to the same products
+    link = canonical_url(page_url)
+
+    products = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        name = _text(item.get("title"))
+        if not name:
+            continue
+        products.append(
+            Product(
+                name=name,
+                link=link,
+                description=_text(item.get("description"))[:DESCRIPTION_LIMIT],
+                image=_text(item.get("image_url")),
+                price=_text(item.get("price")),
+            )
+        )
+    return products
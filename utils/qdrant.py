@@ -1,11 +1,11 @@
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams
-from langchain_ollama import OllamaEmbeddings
+from utils.embeddings import get_embeddings
 from uuid import uuid4
 from raw_data import get_data
 
-embeddings = OllamaEmbeddings(model="mxbai-embed-large:latest")
+embeddings = get_embeddings()
 
 client = QdrantClient(":memory:")
 
@@ -0,0 +1,61 @@
+import time
+import unicodedata
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from utils.async_cache import SingleFlight, TTLCache
+from utils.schema_store import site_key
+
+
+def normalize_query(query: str) -> str:
+    """Case, Unicode form and whitespace insensitive form of a search query."""
+    return " ".join(unicodedata.normalize("NFC", query).lower().split())
+
+
+class QueryCache:
+    """
+    Search results per (normalized query, site) with stale-while-revalidate.
+
+    Entries younger than `ttl` are fresh. Up to `ttl + stale_ttl` they are
+    still served, but flagged stale so the caller refreshes them in the
+    background with refresh(), at most once at a time per key. Entries are
+    evicted LRU beyond `max_entries`.
+    """
+
+    def __init__(self, ttl: float = 900, stale_ttl: float = 86400, max_entries: int = 512):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = TTLCache(ttl + stale_ttl, max_entries)
+        self._flight = SingleFlight()
+
+    @staticmethod
+    def _key(query: str, root: str) -> Tuple[str, str]:
+        return normalize_query(query), site_key(root)
+
+    def get(self, query: str, root: str) -> Optional[Tuple[Any, bool]]:
+        """(value, is_stale), or None when missing or too old to serve."""
+        entry = self._entries.get(self._key(query, root))
+        if entry is None:
+            return None
+        stored_at, value = entry
+        return value, time.monotonic() - stored_at > self.ttl
+
+    def put(self, query: str, root: str, value: Any):
+        # Empty results are not cached, the next search tries again
+        if not value:
+            return
+        self._entries.put(self._key(query, root), (time.monotonic(), value))
+
+    def refresh(self, query: str, root: str, producer: Callable[[], Awaitable[Any]]) -> bool:
+        """Recompute an entry in the background. Returns False if already refreshing."""
+        key = self._key(query, root)
+        if key in self._flight:
+            return False
+
+        async def _run():
+            try:
+                self.put(query, root, await producer())
+            except Exception as e:
+                print(f"Error refreshing results for {key}: {e}")
+
+        self._flight.start(key, _run)
+        return True
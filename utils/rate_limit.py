@@ -0,0 +1,223 @@
+import asyncio
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Mapping, Optional, Tuple, TypeVar
+from urllib.parse import urlparse
+
+T = TypeVar("T")
+
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "8"))
+
+# Politeness per host: concurrent requests, requests per second and how many
+# may go out back to back. The rate adapts (AIMD) between the min and max.
+HOST_MAX_CONCURRENCY = int(os.getenv("HOST_MAX_CONCURRENCY", "4"))
+HOST_RATE = float(os.getenv("HOST_RATE", "1.0"))
+HOST_BURST = int(os.getenv("HOST_BURST", "2"))
+HOST_MIN_RATE = float(os.getenv("HOST_MIN_RATE", "0.1"))
+HOST_MAX_RATE = float(os.getenv("HOST_MAX_RATE", "4.0"))
+
+# Responses that mean "slow down"
+THROTTLE_STATUSES = {403, 429, 503}
+RATE_INCREASE = 0.1
+RATE_DECREASE = 0.5
+# Pause after a throttle response without Retry-After, and cap on Retry-After
+THROTTLE_BACKOFF = 2.0
+MAX_RETRY_AFTER = 300.0
+
+POLL_INTERVAL = 0.05
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After as seconds from now; accepts delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+def _host(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+@dataclass
+class _HostState:
+    rate: float
+    tokens: float
+    updated: float
+    in_flight: int = 0
+    blocked_until: float = 0.0
+
+
+class _Permit:
+    def __init__(self, scheduler: "DomainScheduler", url: str):
+        self.scheduler = scheduler
+        self.url = url
+
+    def record(self, status: int, headers: Optional[Mapping[str, str]] = None):
+        retry_after = headers.get("Retry-After") if headers is not None else None
+        self.scheduler.record(self.url, status, retry_after)
+
+
+class DomainScheduler:
+    """
+    Process-wide politeness scheduler shared by every fetch path.
+
+    Each host gets a concurrency cap and a token bucket whose rate grows
+    additively on successful responses and is halved on 403/429/503
+    (AIMD). Retry-After, or a default pause, blocks the host entirely.
+    State is guarded by a thread lock so that sync fetchers running in
+    worker threads and async fetchers on the event loop share it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = HOST_MAX_CONCURRENCY,
+        rate: float = HOST_RATE,
+        burst: int = HOST_BURST,
+        min_rate: float = HOST_MIN_RATE,
+        max_rate: float = HOST_MAX_RATE,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self._hosts: Dict[str, _HostState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(
+                rate=self.rate, tokens=float(self.burst), updated=time.monotonic()
+            )
+        return state
+
+    def _wait_time(self, host: str, take: bool) -> float:
+        """0 when the host can be hit now (taking a slot if `take`), else seconds to wait."""
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            if state.blocked_until > now:
+                return state.blocked_until - now
+            if state.in_flight >= self.max_concurrency:
+                return POLL_INTERVAL
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * state.rate)
+            state.updated = now
+            if state.tokens < 1:
+                return (1 - state.tokens) / state.rate
+            if take:
+                state.tokens -= 1
+                state.in_flight += 1
+            return 0.0
+
+    async def acquire(self, url: str):
+        host = _host(url)
+        while (wait := self._wait_time(host, take=True)) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, url: str):
+        host = _host(url)
+        while (wait := self._wait_time(host, take=True)) > 0:
+            time.sleep(wait)
+
+    async def ready(self, url: str):
+        """Wait until the host would accept a request, without taking a slot."""
+        host = _host(url)
+        while (wait := self._wait_time(host, take=False)) > 0:
+            await asyncio.sleep(wait)
+
+    def release(self, url: str):
+        with self._lock:
+            state = self._state(_host(url))
+            state.in_flight = max(0, state.in_flight - 1)
+
+    def record(self, url: str, status: int, retry_after: Optional[str] = None):
+        """Feed a response status back into the host's rate."""
+        host = _host(url)
+        with self._lock:
+            state = self._state(host)
+            if status in THROTTLE_STATUSES:
+                state.rate = max(self.min_rate, state.rate * RATE_DECREASE)
+                state.tokens = min(state.tokens, 0.0)
+                delay = parse_retry_after(retry_after)
+                delay = THROTTLE_BACKOFF if delay is None else delay
+                state.blocked_until = max(state.blocked_until, time.monotonic() + delay)
+                print(f"⚠️  {host} answered {status}: {state.rate:.2f} req/s, paused {delay:.1f}s")
+            elif status < 400:
+                state.rate = min(self.max_rate, state.rate + RATE_INCREASE)
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """Hold a request slot for `url`'s host; report the response via permit.record()."""
+        await self.acquire(url)
+        try:
+            yield _Permit(self, url)
+        finally:
+            self.release(url)
+
+    @contextmanager
+    def slot_sync(self, url: str):
+        self.acquire_sync(url)
+        try:
+            yield _Permit(self, url)
+        finally:
+            self.release(url)
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                host: {
+                    "rate": round(state.rate, 3),
+                    "in_flight": state.in_flight,
+                    "blocked_for": round(max(0.0, state.blocked_until - now), 1),
+                }
+                for host, state in self._hosts.items()
+            }
+
+
+scheduler = DomainScheduler()
+
+
+async def rate_limited_batch(
+    urls: Iterable[str],
+    scrape: Callable[[str], Awaitable[T]],
+    max_concurrency: int = SCRAPE_CONCURRENCY,
+) -> AsyncIterator[Tuple[str, T]]:
+    """
+    Run `scrape` over `urls` and yield (url, result) in completion order.
+
+    At most `max_concurrency` scrapes run at once across all hosts. Pacing
+    per host comes from the shared scheduler, which the fetch inside
+    `scrape` goes through.
+    """
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def _run(url: str):
+        # Wait until the host has room before taking a global slot, so a
+        # throttled site does not hold back the others
+        await scheduler.ready(url)
+        async with sem:
+            return url, await scrape(url)
+
+    tasks = [asyncio.ensure_future(_run(url)) for url in dict.fromkeys(urls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # The consumer stopped early (break / disconnect): drop the rest
+        for task in tasks:
+            task.cancel()
@@ -2,45 +2,120 @@ from langchain_core.documents import Document
 from pydantic import BaseModel
 from urllib.parse import urlparse
 from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, Iterable, Optional
 from utils.crawl import crawl
-from utils.url_validator import filter_valid_urls
+from utils.crawler_pool import crawler_pool
+from utils.link_prefilter import PRODUCT_MARKER, link_prefilter
+from utils.url_validator import compile_url_filter
 from utils.web_crawler import crawl_webpage
 import asyncio
+import os
+
+# Pages rendered at once across all get_data calls, and per host
+RAW_CRAWL_CONCURRENCY = int(os.getenv("RAW_CRAWL_CONCURRENCY", "4"))
+RAW_CRAWL_PER_HOST = int(os.getenv("RAW_CRAWL_PER_HOST", "2"))
+
+_crawl_sem: Optional[asyncio.Semaphore] = None
+_host_sems: Dict[str, asyncio.Semaphore] = {}
 
 
 class Data(BaseModel):
     href: str
 
-async def sem_crawl(href):
-    sem = asyncio.Semaphore()
-    async with sem:
-        return await crawl_webpage(href)
 
-async def get_data(href: str) -> list[Document]:
-    """Get all data."""
+def _shared_semaphore() -> asyncio.Semaphore:
+    global _crawl_sem
+    if _crawl_sem is None:
+        _crawl_sem = asyncio.Semaphore(RAW_CRAWL_CONCURRENCY)
+    return _crawl_sem
+
+
+def _host_semaphore(url: str) -> asyncio.Semaphore:
+    host = urlparse(url).netloc.lower()
+    if host not in _host_sems:
+        _host_sems[host] = asyncio.Semaphore(RAW_CRAWL_PER_HOST)
+    return _host_sems[host]
+
+
+async def iter_crawl(urls: Iterable[str], crawler=None, workers: int = RAW_CRAWL_CONCURRENCY) -> AsyncIterator[tuple]:
+    """
+    Crawl `urls` with a fixed set of workers and yield crawl_webpage results
+    as they complete. Only `workers` pages are in flight and finished
+    results wait in a queue of the same size, so memory does not grow with
+    the number of links.
+    """
+    pending = iter(urls)
+    results: asyncio.Queue = asyncio.Queue(maxsize=workers)
+    done = object()
+
+    async def worker():
+        try:
+            for url in pending:
+                async with _shared_semaphore(), _host_semaphore(url):
+                    result = await crawl_webpage(url, crawler)
+                await results.put(result)
+        except Exception as e:
+            print(f"Crawl worker failed: {e}")
+        await results.put(done)
 
-    url, content, links, img = await crawl_webpage(href)
-    print(f"Crawled {url}: {len(content)} characters, {len(links)} links")
-    parsed = urlparse(url)
-    valid_links = filter_valid_urls(links, [parsed.hostname])
-    filtered_links = list(set(valid_links))
-    # with ThreadPoolExecutor(max_workers=4) as executor:
-    #     results = executor.map(crawl_webpage, filtered_links)
-
-    results = await asyncio.gather(*[sem_crawl(link) for link in filtered_links])
-
-    documents = []
-
-    for result in results:
-        # print("-------------------")
-        # print(f"url:{result[0]}")
-        # print(f"content:{result[1][:50]}")
-        if "Giá bán lẻ đề xuất" not in result[1]:
-            continue
-        document = Document(
-            page_content=result[1], metadata={"source": result[0], "image": result[3]}
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    finished = 0
+    try:
+        while finished < len(tasks):
+            result = await results.get()
+            if result is done:
+                finished += 1
+                continue
+            yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def iter_data(href: str, stats: Optional[Dict] = None) -> AsyncIterator[Document]:
+    """
+    Crawl a category page and its links, yielding product documents as they
+    are found. Links are pre-filtered cheaply before the full render; the
+    skip counts are reported and added to `stats`.
+    """
+    stats = stats if stats is not None else {}
+    # One crawler session for the page and all of its links
+    async with crawler_pool.crawler() as crawler:
+        url, content, links, img = await crawl_webpage(href, crawler)
+        print(f"Crawled {url}: {len(content)} characters, {len(links)} links")
+        parsed = urlparse(url)
+        # Canonical (no tracking params / fragments) and de-duplicated
+        filtered_links = compile_url_filter([parsed.hostname]).filter(links)
+        # with ThreadPoolExecutor(max_workers=4) as executor:
+        #     results = executor.map(crawl_webpage, filtered_links)
+
+        render_links = await link_prefilter.filter(filtered_links, stats)
+        stats["rendered"] = stats.get("rendered", 0) + len(render_links)
+        print(
+            f"Rendering {len(render_links)}/{len(filtered_links)} links "
+            f"(skipped {stats['skipped_by_shape']} by URL shape, {stats['skipped_by_fetch']} by HTTP check)"
         )
-        documents.append(document)
+
+        try:
+            async for result in iter_crawl(render_links, crawler):
+                # print("-------------------")
+                # print(f"url:{result[0]}")
+                # print(f"content:{result[1][:50]}")
+                is_product = PRODUCT_MARKER in result[1]
+                if result[1]:
+                    link_prefilter.learn(result[0], is_product)
+                if not is_product:
+                    continue
+                yield Document(
+                    page_content=result[1], metadata={"source": result[0], "image": result[3]}
+                )
+        finally:
+            link_prefilter.save()
+
+
+async def get_data(href: str) -> list[Document]:
+    """Get all data."""
+    documents = [document async for document in iter_data(href)]
 
     # pprint.pprint(results)
     return documents
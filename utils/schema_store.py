@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+SCHEMA_CACHE_DIR = os.getenv("SCHEMA_CACHE_DIR", "./schema_cache")
+# Consecutive zero-yield runs before a schema that used to work is dropped.
+# A schema that never yielded anything is dropped after its first empty run.
+ZERO_YIELD_LIMIT = int(os.getenv("SCHEMA_ZERO_YIELD_LIMIT", "3"))
+
+
+def site_key(root: str) -> str:
+    """Normalized host of a site root, e.g. 'https://www.fahasa.com/' -> 'www.fahasa.com'."""
+    parsed = urlparse(root if "://" in root else f"https://{root}")
+    return (parsed.hostname or "").lower()
+
+
+def atomic_write_json(path: Path, data: Any):
+    """Write JSON to a temp file next to `path`, then rename it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class SchemaStore:
+    """
+    Cached extraction schemas per site.
+
+    Schemas live in `schema_cache/product_schema_<host>.json` with an
+    in-memory LRU in front. Per-schema yield statistics (products extracted
+    per crawled page) are recorded, and a schema whose yield drops to zero
+    is invalidated so it gets regenerated.
+    """
+
+    def __init__(self, cache_dir: str = SCHEMA_CACHE_DIR, max_entries: int = 64):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_entries = max_entries
+        self.stats_file = self.cache_dir / "schema_stats.json"
+        self._schemas: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = self._load_stats()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"product_schema_{key}.json"
+
+    def _load_stats(self) -> Dict[str, Dict[str, Any]]:
+        if not self.stats_file.exists():
+            return {}
+        try:
+            return json.loads(self.stats_file.read_text(encoding="utf-8"))
+        except Exception as e:
+            print(f"Error reading schema stats: {e}")
+            return {}
+
+    def _remember(self, key: str, schema: Dict):
+        self._schemas[key] = schema
+        self._schemas.move_to_end(key)
+        while len(self._schemas) > self.max_entries:
+            self._schemas.popitem(last=False)
+
+    def _key_stats(self, key: str) -> Dict[str, Any]:
+        return self._stats.setdefault(
+            key,
+            {"hits": 0, "runs": 0, "pages": 0, "products": 0, "zero_runs": 0, "last_yield": None},
+        )
+
+    def get(self, root: str) -> Optional[Dict]:
+        key = site_key(root)
+        with self._lock:
+            if key in self._schemas:
+                self._schemas.move_to_end(key)
+                self._key_stats(key)["hits"] += 1
+                return self._schemas[key]
+
+            path = self._path(key)
+            if not path.exists():
+                return None
+            try:
+                schema = json.loads(path.read_text(encoding="utf-8"))
+            except Exception as e:
+                print(f"Error reading schema {path}: {e}")
+                return None
+            self._remember(key, schema)
+            self._key_stats(key)["hits"] += 1
+            return schema
+
+    def has(self, root: str) -> bool:
+        """True if a (still valid) schema is cached for the site."""
+        key = site_key(root)
+        with self._lock:
+            return key in self._schemas or self._path(key).exists()
+
+    def put(self, root: str, schema: Dict):
+        key = site_key(root)
+        with self._lock:
+            atomic_write_json(self._path(key), schema)
+            self._remember(key, schema)
+            # A new schema starts with fresh statistics
+            self._stats.pop(key, None)
+            self._key_stats(key)
+            atomic_write_json(self.stats_file, self._stats)
+
+    def invalidate(self, root: str):
+        key = site_key(root)
+        with self._lock:
+            self._schemas.pop(key, None)
+            path = self._path(key)
+            if path.exists():
+                os.remove(path)
+        print(f"Invalidated schema for {key}")
+
+    def record_yield(self, root: str, pages: int, products: int):
+        """Record one extraction run; drops the schema if its yield fell to zero."""
+        if pages <= 0:
+            return
+        key = site_key(root)
+        with self._lock:
+            stats = self._key_stats(key)
+            stats["runs"] += 1
+            stats["pages"] += pages
+            stats["products"] += products
+            stats["last_yield"] = products / pages
+            stats["last_run_at"] = time.time()
+            stats["zero_runs"] = stats["zero_runs"] + 1 if products == 0 else 0
+            limit = ZERO_YIELD_LIMIT if stats["products"] > 0 else 1
+            invalid = stats["zero_runs"] >= limit
+            atomic_write_json(self.stats_file, self._stats)
+
+        print(f"Schema yield for {key}: {products} products / {pages} pages")
+        if invalid:
+            self.invalidate(root)
+
+    def stats(self, root: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            if root is not None:
+                return dict(self._stats.get(site_key(root), {}))
+            return {key: dict(value) for key, value in self._stats.items()}
+
+
+schema_store = SchemaStore()
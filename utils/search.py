@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional, Protocol
+
+from utils.async_cache import SingleFlight, TTLCache
+from utils.query_cache import normalize_query
+from utils.schema_store import site_key
+
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "ddgs")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_MAX_CONCURRENCY = int(os.getenv("SEARCH_MAX_CONCURRENCY", "2"))
+# Canned results for the stub backend: {"<query> site:<root>": [{"href": ..., "title": ...}]}
+SEARCH_STUB_FILE = os.getenv("SEARCH_STUB_FILE", "./search_stub.json")
+
+
+class SearchBackend(Protocol):
+    """A search provider. `text` is blocking; it is run in a worker thread."""
+
+    def text(self, query: str, max_results: int) -> List[Dict]: ...
+
+
+class DDGSBackend:
+    def text(self, query: str, max_results: int) -> List[Dict]:
+        from ddgs import DDGS
+
+        return DDGS().text(query, max_results=max_results) or []
+
+
+class StubBackend:
+    """Offline provider answering from a dict (or SEARCH_STUB_FILE), for tests and local runs."""
+
+    def __init__(self, results: Optional[Dict[str, List[Dict]]] = None):
+        if results is None and os.path.exists(SEARCH_STUB_FILE):
+            with open(SEARCH_STUB_FILE, "r", encoding="utf-8") as f:
+                results = json.load(f)
+        self.results = results or {}
+
+    def text(self, query: str, max_results: int) -> List[Dict]:
+        return self.results.get(query, [])[:max_results]
+
+
+BACKENDS = {"ddgs": DDGSBackend, "stub": StubBackend}
+
+
+class SearchClient:
+    """
+    Async, cached front for a search backend.
+
+    Results are cached per (normalized query, site, max_results) for `ttl`
+    seconds, identical concurrent searches share one backend call, and at
+    most `max_concurrency` calls reach the provider at once.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[SearchBackend] = None,
+        ttl: float = SEARCH_CACHE_TTL,
+        max_entries: int = SEARCH_CACHE_SIZE,
+        max_concurrency: int = SEARCH_MAX_CONCURRENCY,
+    ):
+        self.backend = backend or BACKENDS[SEARCH_BACKEND]()
+        self.max_concurrency = max_concurrency
+        self._entries = TTLCache(ttl, max_entries)
+        self._flight = SingleFlight()
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def set_backend(self, backend: SearchBackend):
+        """Swap the provider (e.g. a stub in tests) and drop cached results."""
+        self.backend = backend
+        self._entries.clear()
+
+    async def search(self, query: str, root: str, max_results: int = 20) -> List[Dict]:
+        """`query` restricted to `root`'s site, as a list of {"href", "title", ...} results."""
+        key = (normalize_query(query), site_key(root), max_results)
+        results = self._entries.get(key)
+        if results is not None:
+            return list(results)
+
+        async def _search():
+            if self._sem is None:
+                self._sem = asyncio.Semaphore(self.max_concurrency)
+            async with self._sem:
+                results = await asyncio.to_thread(self.backend.text, f"{query} site:{root}", max_results)
+            # Empty answers are often rate-limit artefacts: not cached
+            if results:
+                self._entries.put(key, results)
+            return results
+
+        return list(await self._flight.do(key, _search))
+
+    async def urls(self, query: str, root: str, max_results: int = 20) -> List[str]:
+        return [result["href"] for result in await self.search(query, root, max_results) if result.get("href")]
+
+
+search_client = SearchClient()
@@ -2,9 +2,9 @@ from typing import List, Optional
 from pydantic import BaseModel, Field
 from langchain_core.documents import Document
 from langchain_chroma import Chroma
-from langchain_ollama import OllamaEmbeddings
+from utils.embeddings import get_embeddings
 
-embeddings = OllamaEmbeddings(model="mxbai-embed-large:latest")
+embeddings = get_embeddings()
 
 
 class AttributeInfo(BaseModel):
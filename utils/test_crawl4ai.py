@@ -1,12 +1,10 @@
-from crawl4ai.deep_crawling.filters import FilterChain, SEOFilter, ContentRelevanceFilter
-from crawl4ai.deep_crawling.scorers import KeywordRelevanceScorer
+from crawl4ai.deep_crawling.filters import FilterChain, SEOFilter, ContentRelevanceFilter, URLFilter
 from crawl4ai.content_scraping_strategy import LXMLWebScrapingStrategy
-from crawl4ai.deep_crawling import BFSDeepCrawlStrategy, DFSDeepCrawlStrategy, BestFirstCrawlingStrategy
+from crawl4ai.deep_crawling import BFSDeepCrawlStrategy, DFSDeepCrawlStrategy
 import os
 import asyncio
-import json
 from pydantic import BaseModel, Field
-from typing import List
+from typing import List, Set, Tuple
 from crawl4ai import (
     AsyncWebCrawler,
     BrowserConfig,
@@ -17,16 +15,38 @@ from crawl4ai import (
 from crawl4ai import LLMExtractionStrategy, JsonXPathExtractionStrategy
 from dotenv import load_dotenv
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
-from pathlib import Path
 from crawl4ai.content_filter_strategy import PruningContentFilter
 from langchain_core.documents import Document
+from utils.crawler_pool import crawler_pool
+from utils.schema_store import schema_store
+from utils.products import decode_products
+from utils.canonical_url import SeenSet, canonical_url
+from utils.crawl_planner import CrawlBudget, plan_deep_crawl, yield_history
 
 load_dotenv()
 
 
 ##################### test deep crawl ##################################
 
-async def test_deep_crawl(root: str, query: str) -> List[Document]:
+class CanonicalDedupFilter(URLFilter):
+    """Rejects links whose canonical URL was already discovered in this crawl."""
+
+    def __init__(self, seen: SeenSet = None):
+        super().__init__()
+        self.seen = seen if seen is not None else SeenSet()
+
+    def apply(self, url: str) -> bool:
+        passed = self.seen.add(url)
+        self._update_stats(passed)
+        return passed
+
+
+async def test_deep_crawl(root: str, query: str) -> Tuple[List[Document], Set[str]]:
+    """
+    Deep crawl a site with its cached schema. Returns the product documents
+    and the canonical URLs of every page crawled successfully, including
+    pages that yielded no products (their stored products are gone).
+    """
 
     # Create an SEO filter that looks for specific keywords in page metadata
     seo_filter = SEOFilter(
@@ -40,36 +60,34 @@ async def test_deep_crawl(root: str, query: str) -> List[Document]:
         threshold=0.3  # Minimum similarity score (0.0 to 1.0)
     )
 
-    # Create a scorer
-    keyword_scorer = KeywordRelevanceScorer(
-        keywords=[query],
-        weight=0.3
-    )
-
-    cache_dir = Path("./schema_cache")
-    cache_dir.mkdir(exist_ok=True)
-    schema_file = cache_dir / f"product_schema_{root[8:]}.json"
-
-    # 1. Generate or load schema
-    if schema_file.exists():
-        xpath_schema = json.load(schema_file.open())
-        print(f"Using cached schema: {xpath_schema}")
+    # 1. Load schema
+    xpath_schema = schema_store.get(root)
+    if xpath_schema is None:
+        print(f"No cached schema for {root}, skipping deep crawl")
+        return [], set()
+    print(f"Using cached schema: {xpath_schema}")
 
     xpath_strategy = JsonXPathExtractionStrategy(xpath_schema)
 
-    # Configure a 2-level deep crawl
+    # The root counts as discovered already
+    seen = SeenSet()
+    seen.add(root)
+
+    # Links are visited best-first by query relevance and product URL shape,
+    # within the configured depth / page / time budget
+    budget = CrawlBudget()
+    strategy = plan_deep_crawl(
+        query,
+        budget,
+        # filter_chain=FilterChain([relevance_filter, seo_filter]),
+        # The same product under different tracking params is crawled once
+        filter_chain=FilterChain([CanonicalDedupFilter(seen)]),
+    )
     config = CrawlerRunConfig(
-        deep_crawl_strategy=BestFirstCrawlingStrategy(
-            max_depth=2,
-            include_external=False,
-            # filter_chain=FilterChain([relevance_filter, seo_filter]),
-            # Maximum number of pages to crawl (optional)
-            max_pages=100,
-            # score_threshold=0.3,       # Minimum score for URLs to be crawled (optional)
-            # url_scorer=keyword_scorer,
-        ),
+        deep_crawl_strategy=strategy,
         scraping_strategy=LXMLWebScrapingStrategy(),
         verbose=True,
+        stream=True,
         cache_mode=CacheMode.BYPASS,
         extraction_strategy=xpath_strategy,
         markdown_generator=DefaultMarkdownGenerator(
@@ -77,110 +95,54 @@ async def test_deep_crawl(root: str, query: str) -> List[Document]:
         ),
     )
 
-    results = []
+    pages = 0
 
     final_results = []
 
+    crawled_pages = set()
+
+    async def consume(crawler):
+        nonlocal pages
+        async for result in await crawler.arun(root, config=config):
+            pages += 1
+            if not result.success:
+                continue
+            crawled_pages.add(canonical_url(result.url))
+
+            print(f"URL: {result.url}")
+            print(f"Depth: {result.metadata.get('depth', 0)}")
+
+            products = decode_products(result.extracted_content, result.url)
+            # Teach the shape scorer which links lead to products
+            yield_history.learn(result.url, bool(products))
+            final_results.extend(product.to_document() for product in products)
+            print(f"Number of final results so far: {len(final_results)}")
+
+            if budget.enough(len(final_results)):
+                print(f"Reached {budget.target_products} products, stopping deep crawl")
+                strategy.cancel()
+                break
+
     try:
 
-        async with AsyncWebCrawler() as crawler:
+        async with crawler_pool.crawler() as crawler:
             try:
-                results = await crawler.arun(root, config=config)
+                await asyncio.wait_for(consume(crawler), timeout=budget.time_budget)
+            except asyncio.TimeoutError:
+                print(f"Time budget of {budget.time_budget}s reached, stopping deep crawl")
             except Exception as e:
                 print(f"Error during crawling: {e}")
 
-            print(f"Crawled {len(results)} pages in total")
-
-
-            # Access individual results
-            for result in results:  # Show first 3 results
-                if result.success:
-                
-                    print(f"URL: {result.url}")
-                    print(f"Depth: {result.metadata.get('depth', 0)}")
-                    if result.success:
-                        print(f"Extracted Content: {result.extracted_content}")
-                        # print(f"Extracted Content Type: {type(result.extracted_content)}")
-                        # print(f"Number of content items: {len(result.extracted_content)}")
-                        if result.extracted_content == "[]":
-                            print(f"No content extracted for {result.url}")
-                            continue
-                        print("Extracted content not empty!!!")
-
-                        import ast
-                        res = ast.literal_eval(result.extracted_content)
-
-                        for r in res:
-                            final_result = {}
-                            print(f"Extracted item: {r}")
-                            try:
-                                print(f"Title: {r['title']}")
-                                final_result["name"] = r["title"]
-                            except Exception as e:
-                                print(f"Error retrieving title metadata: {str(e)}")
-                                final_result["name"] = None
-                                continue
-                            try:
-                                print(f"URL: {result.url}")
-                                final_result["link"] = result.url
-                            except Exception as e:
-                                print(f"Error retrieving URL: {str(e)}")
-                                final_result["link"] = None
-                                continue
-                            # try:
-                            #     print(f"Price: {r['price']}")
-                            #     final_result["price"] = r["price"]
-                            # except Exception as e:
-                            #     print(
-                            #         f"Error parsing extracted price content: {str(e)}")
-                            #     final_result["price"] = None
-                            #     continue
-                            try:
-                                print(f"Description: {r['description']}")
-                                # Truncate long description
-                                final_result["description"] = r["description"][:200]
-                            except Exception as e:
-                                print(
-                                    f"Error retrieving description metadata: {str(e)}")
-                                final_result["description"] = None
-                                continue
-                            try:
-                                print(f"Image: {r['image_url']}")
-                                final_result["image"] = r["image_url"]
-                            except Exception as e:
-                                print(f"Error retrieving image metadata: {str(e)}")
-                                final_result["image"] = None
-                                continue
-                            # print(f"Raw Markdown Length: {len(result.markdown.raw_markdown)}")
-                            # print(
-                            #     f"Citations Markdown Length: {len(result.markdown.markdown_with_citations)}"
-                            # )
-
-                            print(f"Appending {final_result}")
-
-                            document = Document(
-                                page_content=final_result['name'] +
-                                final_result['description'],
-                                metadata={"title": final_result['name'],
-                                        "url": final_result['link'],
-                                        # "price": final_result['price'],
-                                        "image_url": final_result['image'],
-                                        "description": final_result['description']}
-                            )
-
-                            final_results.append(document)
-                            print(
-                                f"Number of final results so far: {len(final_results)}")
-                            # if len(final_results) > 10:
-                            #     print(
-                            #         "More than 10 final results, stopping further processing.")
-                            #     break
-
-        return final_results
+            print(f"Crawled {pages} pages in total")
+
+        schema_store.record_yield(root, pages, len(final_results))
+        yield_history.save()
+
+        return final_results, crawled_pages
 
     except Exception as e:
         print(f"Error during deep crawl: {e}")
-        return final_results
+        return final_results, crawled_pages
 
 #####################################################################
 
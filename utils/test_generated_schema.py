@@ -11,132 +11,118 @@ from crawl4ai import CrawlerMonitor, DisplayMode
 from crawl4ai.async_dispatcher import MemoryAdaptiveDispatcher
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 from crawl4ai.content_filter_strategy import PruningContentFilter
-from pathlib import Path
-import json
+from utils.crawler_pool import crawler_pool
+from utils.schema_store import schema_store
+from utils.products import decode_products
+from utils.debug_artifacts import capture
+from utils.canonical_url import SeenSet
 
 import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
-async def run_extraction(crawler: AsyncWebCrawler, urls, strategy, name):
-    """Helper function to run extraction with proper configuration"""
+def _extraction_config(strategy, stream=False):
+    # Configure the crawler run settings
+    config = CrawlerRunConfig(
+        verbose=True,
+        cache_mode=CacheMode.BYPASS,
+        extraction_strategy=strategy,
+        markdown_generator=DefaultMarkdownGenerator(
+            content_filter=PruningContentFilter()  # For fit_markdown support
+        ),
+        stream=stream,
+    )
 
-    try:
-        # Configure the crawler run settings
-        config = CrawlerRunConfig(
-            verbose=True,
-            cache_mode=CacheMode.BYPASS,
-            extraction_strategy=strategy,
-            markdown_generator=DefaultMarkdownGenerator(
-                content_filter=PruningContentFilter()  # For fit_markdown support
-            ),
-        )
+    dispatcher = MemoryAdaptiveDispatcher(
+        memory_threshold_percent=90.0,
+        check_interval=1.0,
+        max_session_permit=10,
+        # monitor=CrawlerMonitor(display_mode=DisplayMode.DETAILED),
+    )
 
-        dispatcher = MemoryAdaptiveDispatcher(
-            memory_threshold_percent=90.0,
-            check_interval=1.0,
-            max_session_permit=10,
-            # monitor=CrawlerMonitor(display_mode=DisplayMode.DETAILED),
-        )
+    return config, dispatcher
 
-        # # Run the crawler
-        # result = await crawler.arun(url=url, config=config)
-        final_results = []
 
-        async with crawler:
-            # Get all results at once
-            results = await crawler.arun_many(
-                urls=urls, config=config, dispatcher=dispatcher
-            )
+def _extract_products(result, name):
+    """Turn one crawl result into a list of product dicts"""
+    if not result.success:
+        print(f"Error in {name}: Crawl failed")
+        return []
+
+    products = decode_products(result.extracted_content, result.url)
+    print(f"=== {name}: {len(products)} products from {result.url}")
+
+    return [product.to_dict() for product in products]
 
-        # Process all results after completion
-        for result in results:
-            if result.success:
-                print(f"\n=== {name} Results ===")
-                print(f"Extracted Content: {result.extracted_content}")
-                # print(f"Extracted Content Type: {type(result.extracted_content)}")
-                # print(f"Number of content items: {len(result.extracted_content)}")
-                if result.extracted_content == "[]":
-                    print(f"No content extracted for {result.url}")
+
+async def stream_extraction(crawler: AsyncWebCrawler, urls, strategy, name, batch_size=1, max_products=10, stats=None):
+    """
+    Run extraction and yield products in small batches as pages complete,
+    instead of waiting for the whole crawl.
+
+    If a `stats` dict is given, it is filled with the number of crawled
+    pages and extracted products.
+    """
+    config, dispatcher = _extraction_config(strategy, stream=True)
+
+    batch = []
+    total = 0
+    pages = 0
+    if stats is None:
+        stats = {}
+
+    # Tracking-parameter variants of a page are fetched once
+    urls = SeenSet().filter(urls)
+    seen_products = SeenSet()
+
+    try:
+        # The crawler is leased from the shared pool, so it is not closed here
+        async for result in await crawler.arun_many(
+            urls=urls, config=config, dispatcher=dispatcher
+        ):
+            pages += 1
+            for product in _extract_products(result, name):
+                if not seen_products.add(product["link"], product["name"]):
                     continue
-                print("Extracted content not empty!!!")
-
-                import ast
-                res = ast.literal_eval(result.extracted_content)
-
-                for r in res:
-                    final_result = {}
-                    print(f"Extracted item: {r}")
-                    try:
-                        print(f"Title: {r['title']}")
-                        final_result["name"] = r["title"]
-                    except Exception as e:
-                        print(f"Error retrieving title metadata: {str(e)}")
-                        final_result["name"] = None
-                        continue
-                    try:
-                        print(f"URL: {result.url}")
-                        final_result["link"] = result.url
-                    except Exception as e:
-                        print(f"Error retrieving URL: {str(e)}")
-                        final_result["link"] = None
-                        continue                       
-                    # try:
-                    #     print(f"Price: {r['price']}")
-                    #     final_result["price"] = r["price"]
-                    # except Exception as e:
-                    #     print(f"Error parsing extracted price content: {str(e)}")
-                    #     final_result["price"] = None
-                    #     continue
-                    try:
-                        print(f"Description: {r['description']}")
-                        final_result["description"] = r["description"][:200]  # Truncate long description
-                    except Exception as e:
-                        print(f"Error retrieving description metadata: {str(e)}")
-                        final_result["description"] = None
-                        continue                        
-                    try:
-                        print(f"Image: {r['image_url']}")
-                        final_result["image"] = r["image_url"]
-                    except Exception as e:
-                        print(f"Error retrieving image metadata: {str(e)}")
-                        final_result["image"] = None
-                        continue
-                    # print(f"Raw Markdown Length: {len(result.markdown.raw_markdown)}")
-                    # print(
-                    #     f"Citations Markdown Length: {len(result.markdown.markdown_with_citations)}"
-                    # )
-
-                    print(f"Appending {final_result}")
-
-                    final_results.append(final_result)
-                    print(f"Number of final results so far: {len(final_results)}")
-                    if len(final_results) > 10:
-                        print("More than 10 final results, stopping further processing.")
-                        break
-
-            else:
-                print(f"Error in {name}: Crawl failed")
+                batch.append(product)
+                total += 1
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+                if total > max_products:
+                    print(f"More than {max_products} final results, stopping further processing.")
+                    break
+            if total > max_products:
+                break
 
     except Exception as e:
         print(f"Error in {name}: {str(e)}")
 
-    return final_results
+    stats["pages"] = pages
+    stats["products"] = total
 
+    if batch:
+        yield batch
 
-async def extract_with_generated_schema(urls, root):
-    # print("Extracting with generated schema for URL:", url)
 
-    # return
+async def run_extraction(crawler: AsyncWebCrawler, urls, strategy, name, stats=None):
+    """Helper function to run extraction with proper configuration"""
+
+    final_results = []
 
-    cache_dir = Path("./schema_cache")
-    cache_dir.mkdir(exist_ok=True)
-    schema_file = cache_dir / f"product_schema_{root[8:]}.json"
+    async for batch in stream_extraction(crawler, urls, strategy, name, stats=stats):
+        final_results.extend(batch)
+        print(f"Number of final results so far: {len(final_results)}")
 
+    return final_results
+
+
+async def _load_xpath_strategy(urls, root):
+    """Load the cached schema of a site, or generate it from the first URL"""
     # 1. Generate or load schema
-    if schema_file.exists():
-        xpath_schema = json.load(schema_file.open())
+    xpath_schema = schema_store.get(root)
+    if xpath_schema is not None:
         print(f"Using cached schema: {xpath_schema}")
     if xpath_schema is None:
         print("Generating schema via LLM...")
@@ -146,19 +132,14 @@ async def extract_with_generated_schema(urls, root):
         )
 
         # Get sample HTML for context
-        async with AsyncWebCrawler() as crawler:
+        async with crawler_pool.crawler() as crawler:
             result = await crawler.arun(
                 # "https://rangdongstore.vn/am-dien-sieu-toc-17l-rd-ast17-p1-p-221223003166",
                 urls[0],
                 config=run_config,
             )
             html = result.fit_html
-        try:
-            with open("html.html", "w") as f:
-                f.write(html)
-            print("Sample HTML written to html.html for reference.")
-        except Exception as e:
-            print(f"Error writing HTML to file: {str(e)}")
+        capture("sample.html", html)
 
         # # Option 1: Using OpenAI (requires API token)
         # css_schema = JsonCssExtractionStrategy.generate_schema(
@@ -199,38 +180,58 @@ async def extract_with_generated_schema(urls, root):
         )
 
         # Cache pattern for future use
-        json.dump(xpath_schema, schema_file.open("w"), indent=2)
+        schema_store.put(root, xpath_schema)
 
     xpath_strategy = JsonXPathExtractionStrategy(xpath_schema)
 
-    with open("xpath_schema.txt", "w") as f:
-        for key in xpath_schema:
-            f.write(f"{key}: {xpath_schema[key]}\n")
+    capture(
+        "xpath_schema.txt",
+        lambda: "".join(f"{key}: {xpath_schema[key]}\n" for key in xpath_schema),
+    )
+
+    return xpath_strategy
+
+
+async def extract_with_generated_schema(urls, root):
+    xpath_strategy = await _load_xpath_strategy(urls, root)
 
+    stats = {}
     # print("Generated strategy:", css_schema)
-    async with AsyncWebCrawler() as crawler:
+    async with crawler_pool.crawler() as crawler:
         result = await run_extraction(
             crawler,
             # "https://dohu.vn/product",
             urls,
             xpath_strategy,
             "XPath Extraction",
+            stats=stats,
         )
+    schema_store.record_yield(root, stats.get("pages", 0), stats.get("products", 0))
 
     # print("Final extracted results:", result)
 
     return result
 
 
+async def stream_with_generated_schema(urls, root, batch_size=1):
+    """Like extract_with_generated_schema, but yields product batches as pages complete"""
+    xpath_strategy = await _load_xpath_strategy(urls, root)
+
+    stats = {}
+    async with crawler_pool.crawler() as crawler:
+        async for batch in stream_extraction(
+            crawler, urls, xpath_strategy, "XPath Extraction", batch_size=batch_size, stats=stats
+        ):
+            yield batch
+    schema_store.record_yield(root, stats.get("pages", 0), stats.get("products", 0))
+
+
 async def create_xpath_strategy(url, root, overwrite=False, strategy_list=[]):
     print("Generating schema via LLM...")
 
-    cache_dir = Path("./schema_cache")
-    cache_dir.mkdir(exist_ok=True)
-    schema_file = cache_dir / f"product_schema_{root[8:]}.json"
+    xpath_schema = None if overwrite else schema_store.get(root)
 
-    if schema_file.exists() and not overwrite:
-        xpath_schema = json.load(schema_file.open())
+    if xpath_schema is not None:
         print(f"Using cached schema: {xpath_schema}")
 
     else:
@@ -239,19 +240,14 @@ async def create_xpath_strategy(url, root, overwrite=False, strategy_list=[]):
         )
 
         # Get sample HTML for context
-        async with AsyncWebCrawler() as crawler:
+        async with crawler_pool.crawler() as crawler:
             result = await crawler.arun(
                 # "https://rangdongstore.vn/am-dien-sieu-toc-17l-rd-ast17-p1-p-221223003166",
                 url,
                 config=run_config,
             )
             html = result.fit_html
-        try:
-            with open("html.html", "w") as f:
-                f.write(html)
-            print("Sample HTML written to html.html for reference.")
-        except Exception as e:
-            print(f"Error writing HTML to file: {str(e)}")
+        capture("sample.html", html)
 
         target_json_example = {
             "name": "Product Cards",
@@ -299,7 +295,7 @@ async def create_xpath_strategy(url, root, overwrite=False, strategy_list=[]):
         )
 
         # Cache pattern for future use
-        json.dump(xpath_schema, schema_file.open("w"), indent=2)
+        schema_store.put(root, xpath_schema)
 
     xpath_strategy = JsonXPathExtractionStrategy(xpath_schema)
 
@@ -318,6 +314,6 @@ if __name__ == "__main__":
         for item in products:
             print("product:", item)
 
-        return
+        await crawler_pool.close()
 
     asyncio.run(schema_and_extract(urls, root="https://rangdongstore.vn"))
@@ -0,0 +1,51 @@
+import asyncio
+from typing import List
+
+import httpx
+
+from utils.http_client import get_client
+from utils.rate_limit import THROTTLE_STATUSES, scheduler
+
+PROBE_TIMEOUT = 5.0
+MAX_CONCURRENT_PROBES = 10
+
+# HEAD is not supported everywhere; these statuses mean "retry with a ranged GET"
+HEAD_FALLBACK_STATUSES = {403, 405, 501}
+
+
+async def _probe(client: httpx.AsyncClient, url: str, sem: asyncio.Semaphore, timeout: float) -> bool:
+    """Return True if the URL answers with a 2xx status."""
+    async with sem:
+        try:
+            # Probes are cheap and bounded by `sem`, so they skip the per-host
+            # token bucket; throttling answers still slow down the real fetches
+            response = await client.head(url, timeout=timeout)
+            if response.status_code in HEAD_FALLBACK_STATUSES:
+                response = await client.get(url, headers={"Range": "bytes=0-0"}, timeout=timeout)
+            if response.status_code in THROTTLE_STATUSES:
+                scheduler.record(url, response.status_code, response.headers.get("Retry-After"))
+            return 200 <= response.status_code < 300
+        except Exception as e:
+            print(f"Error probing {url}: {e}")
+            return False
+
+
+async def probe_urls(
+    urls: List[str],
+    max_concurrency: int = MAX_CONCURRENT_PROBES,
+    timeout: float = PROBE_TIMEOUT,
+) -> List[str]:
+    """
+    Probe all candidate URLs concurrently.
+
+    Returns the live URLs in their original (search rank) order.
+    """
+    if not urls:
+        return []
+
+    sem = asyncio.Semaphore(max_concurrency)
+    # Shared keep-alive client: the pages we probe are fetched again right after
+    client = get_client()
+    alive = await asyncio.gather(*[_probe(client, url, sem, timeout) for url in urls])
+
+    return [url for url, ok in zip(urls, alive) if ok]
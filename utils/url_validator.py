@@ -1,52 +1,118 @@
+from functools import lru_cache
+from typing import Iterable, List, Optional, Set, Tuple
 from urllib.parse import urlparse
 
+from utils.canonical_url import SeenSet, canonical_url
 
-def is_basic_valid_url(url):
-    """Check if URL has basic validity (proper scheme and netloc) without domain restrictions."""
-    parsed = urlparse(url)
-    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+_END = ""
 
 
-def is_valid_url(url, allowed_prefixes_or_domains):
-    """Check if URL is valid based on allowed prefixes or domains."""
-    parsed = urlparse(url)
+class UrlFilter:
+    """
+    Allow-list of URL prefixes and domains, compiled once.
+
+    Prefixes go into a character trie, so a URL is matched in one walk over
+    its own characters whatever the number of prefixes. Domains are a set
+    checked against each suffix of the host (a.b.example.com, b.example.com,
+    example.com, com). An empty allow-list accepts every http(s) URL.
+    """
 
-    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+    def __init__(self, allowed_prefixes_or_domains: Iterable[str] = ()):
+        self._trie: dict = {}
+        self._domains: Set[str] = set()
+        self._unrestricted = True
+        for allowed in allowed_prefixes_or_domains:
+            self._unrestricted = False
+            allowed_lower = allowed.lower()
+            # A URL prefix contains a protocol or a path, anything else is a domain
+            if allowed_lower.startswith(("http://", "https://")) or "/" in allowed_lower:
+                node = self._trie
+                for char in allowed_lower:
+                    node = node.setdefault(char, {})
+                node[_END] = True
+            else:
+                self._domains.add(allowed_lower)
+
+    def _has_prefix(self, url_lower: str) -> bool:
+        node = self._trie
+        for char in url_lower:
+            if _END in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return _END in node
+
+    def _has_domain(self, domain: str) -> bool:
+        if domain in self._domains:
+            return True
+        index = domain.find(".")
+        while index != -1:
+            if domain[index + 1 :] in self._domains:
+                return True
+            index = domain.find(".", index + 1)
         return False
 
-    url_lower = url.lower()
-    domain = parsed.netloc.lower()
+    def matches(self, url: str) -> bool:
+        """Same rules as is_valid_url."""
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or not parsed.netloc:
+            return False
+        if self._unrestricted:
+            return True
+        if self._trie and self._has_prefix(url.lower()):
+            return True
+        return bool(self._domains) and self._has_domain(parsed.netloc.lower().split(":")[0])
+
+    def filter(self, urls: Iterable[str], seen: Optional[SeenSet] = None) -> List[str]:
+        """
+        Canonical, de-duplicated URLs that pass the filter, in input order.
+
+        Pass the same `seen` set across batches to de-duplicate a whole crawl.
+        """
+        seen = SeenSet() if seen is None else seen
+        result = []
+        for url in urls:
+            if not url:
+                continue
+            canonical = canonical_url(url)
+            if not self.matches(canonical) or not seen.add(canonical):
+                continue
+            result.append(canonical)
+        return result
+
+
+@lru_cache(maxsize=64)
+def _compiled(allowed: Tuple[str, ...]) -> UrlFilter:
+    return UrlFilter(allowed)
+
+
+def compile_url_filter(allowed_prefixes_or_domains) -> UrlFilter:
+    """Shared compiled filter for an allow-list."""
+    return _compiled(tuple(allowed_prefixes_or_domains or ()))
 
-    # Remove port from domain if present
-    if ":" in domain:
-        domain = domain.split(":")[0]
 
-    for allowed in allowed_prefixes_or_domains:
-        allowed_lower = allowed.lower()
+def is_basic_valid_url(url):
+    """Check if URL has basic validity (proper scheme and netloc) without domain restrictions."""
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
 
-        # Check if it's a URL prefix (contains protocol or path)
-        if allowed_lower.startswith(("http://", "https://")) or "/" in allowed_lower:
-            # URL prefix matching
-            if url_lower.startswith(allowed_lower):
-                return True
-        else:
-            # Domain-based matching (legacy behavior)
-            if domain == allowed_lower or domain.endswith("." + allowed_lower):
-                return True
 
-    return False
+def is_valid_url(url, allowed_prefixes_or_domains):
+    """Check if URL is valid based on allowed prefixes or domains."""
+    if not allowed_prefixes_or_domains:
+        return False
+    return compile_url_filter(allowed_prefixes_or_domains).matches(url)
 
 
 def filter_valid_urls(urls, allowed_prefixes_or_domains):
     """Filter URLs based on allowed prefixes or domains.
 
     If allowed_prefixes_or_domains is empty, all valid URLs are returned (no domain filtering).
+    URLs are returned as given; use UrlFilter.filter for canonical, de-duplicated output.
     """
-    if not allowed_prefixes_or_domains:
-        # If no domains specified, only filter out invalid URLs (malformed, non-http/https)
-        return [url for url in urls if is_basic_valid_url(url)]
-
-    return [url for url in urls if is_valid_url(url, allowed_prefixes_or_domains)]
+    url_filter = compile_url_filter(allowed_prefixes_or_domains)
+    return [url for url in urls if url_filter.matches(url)]
 
 
 if __name__ == "__main__":
@@ -1,10 +1,16 @@
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
+from crawl4ai import CrawlerRunConfig
+from utils.crawler_pool import crawler_pool
 
-async def crawl_webpage(url):
+async def crawl_webpage(url, crawler=None):
     """
     Crawl webpage to extract markdown content and all links using crawl4ai.
     This is an async function that should be awaited in async contexts.
+    Pass `crawler` to reuse an already leased crawler session.
     """
+    if crawler is None:
+        async with crawler_pool.crawler() as crawler:
+            return await crawl_webpage(url, crawler)
+
     # crawl4ai uses playwright, which may need to be installed via:
     # pip install playwright
     # python -m playwright install
@@ -15,39 +21,38 @@ async def crawl_webpage(url):
         wait_until="domcontentloaded"
     )
     
-    async with AsyncWebCrawler() as crawler:
-        try: 
-            result = await crawler.arun(url=url, config=config)
-            
-            if not result or not result.success:
-                raise Exception(f"Failed to crawl {url}. Error: {result.error_message if result else 'Unknown error'}")
-                
-            # The main content is in result.markdown
-            clean_text = result.markdown
+    try: 
+        result = await crawler.arun(url=url, config=config)
 
-            # Links are in result.links, categorized. Extract just the href.
-            all_link_objects = result.links.get('internal', []) + result.links.get('external', [])
-            links = [link.get('href') for link in all_link_objects if link.get('href')]
+        if not result or not result.success:
+            raise Exception(f"Failed to crawl {url}. Error: {result.error_message if result else 'Unknown error'}")
 
-            # Get images
-            images_info = result.media.get("images", [])
+        # The main content is in result.markdown
+        clean_text = result.markdown
 
-            for i, img in enumerate(images_info[:3]):  # Inspect just the first 3
-                print(f"[Image {i}] URL: {img['src']}")
-                print(f"           Alt text: {img.get('alt', '')}")
-                print(f"           Score: {img.get('score')}")
-                print(f"           Description: {img.get('desc', '')}\n")
+        # Links are in result.links, categorized. Extract just the href.
+        all_link_objects = result.links.get('internal', []) + result.links.get('external', [])
+        links = [link.get('href') for link in all_link_objects if link.get('href')]
 
-            print(f"Found {len(images_info)} images in total.")
-            img_src = [img['src'] for img in images_info]
-            for img in img_src:
-                print(f"Image URL: {img}")
-            image = img_src[0] if img_src else ""
-        
-            return url, clean_text, links, image
-        except Exception as e:
-            print(f"Error crawling {url}: {e}")
-            return url, "", [], ""
+        # Get images
+        images_info = result.media.get("images", [])
+
+        for i, img in enumerate(images_info[:3]):  # Inspect just the first 3
+            print(f"[Image {i}] URL: {img['src']}")
+            print(f"           Alt text: {img.get('alt', '')}")
+            print(f"           Score: {img.get('score')}")
+            print(f"           Description: {img.get('desc', '')}\n")
+
+        print(f"Found {len(images_info)} images in total.")
+        img_src = [img['src'] for img in images_info]
+        for img in img_src:
+            print(f"Image URL: {img}")
+        image = img_src[0] if img_src else ""
+
+        return url, clean_text, links, image
+    except Exception as e:
+        print(f"Error crawling {url}: {e}")
+        return url, "", [], ""
 
 if __name__ == "__main__":
     import asyncio
@@ -79,5 +84,7 @@ if __name__ == "__main__":
 
         if img:
             print(f"\nFirst image URL: {img}")
+
+        await crawler_pool.close()
     
     asyncio.run(main()) 
\ No newline at end of file